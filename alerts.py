@@ -0,0 +1,208 @@
+# Price alerts held in sorted threshold indexes and checked on every quote
+#
+# Alerts are kept per (karat, direction) in a sorted list of thresholds, so a
+# tick finds the fired alerts with one bisect (O(log n + k)). Fired alerts
+# are removed, grouped into one notification per user, rate limited, and
+# handed to a sink (anything with a send(notification) method).
+import bisect
+import itertools
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+
+ABOVE = "above"
+BELOW = "below"
+
+Alert = namedtuple("Alert", "id user karat direction threshold")
+Notification = namedtuple("Notification", "user alerts prices sent_at")
+
+
+# In-memory sink: keeps recent notifications per user (also the test stub)
+class MemorySink:
+    def __init__(self, max_per_user=50):
+        self._lock = threading.Lock()
+        self._inbox = defaultdict(lambda: deque(maxlen=max_per_user))
+
+    def send(self, notification):
+        with self._lock:
+            self._inbox[notification.user].append(notification)
+
+    # Remove and return a user's pending notifications
+    def drain(self, user):
+        with self._lock:
+            inbox = self._inbox.pop(user, ())
+            return list(inbox)
+
+
+class _Index:
+    __slots__ = ("thresholds", "ids")
+
+    def __init__(self):
+        self.thresholds = []
+        self.ids = []
+
+
+class AlertEngine:
+    # min_interval: seconds between two notifications to the same user;
+    # alerts firing in between are held and sent together afterwards
+    def __init__(self, sink, min_interval=60.0, clock=time.monotonic):
+        self.sink = sink
+        self.min_interval = min_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._alerts = {}
+        self._keys = {}
+        self._by_user = defaultdict(set)
+        self._indexes = defaultdict(_Index)
+        self._last_sent = {}
+        self._held = defaultdict(list)
+        self._thread = None
+        self._stop = threading.Event()
+        self.ticks = 0
+        self.errors = 0
+
+    def __len__(self):
+        return len(self._alerts)
+
+    # Alert when the karat's price crosses threshold in direction (ABOVE: price >= threshold,
+    # BELOW: price <= threshold). Adding the same alert twice returns the existing id.
+    def add(self, user, karat, direction, threshold):
+        if direction not in (ABOVE, BELOW):
+            raise ValueError(f"unknown direction: {direction}")
+        threshold = round(float(threshold), 2)
+        key = (user, karat, direction, threshold)
+        with self._lock:
+            if key in self._keys:
+                return self._keys[key]
+            alert = Alert(next(self._ids), user, karat, direction, threshold)
+            index = self._indexes[(karat, direction)]
+            position = bisect.bisect_right(index.thresholds, threshold)
+            index.thresholds.insert(position, threshold)
+            index.ids.insert(position, alert.id)
+            self._alerts[alert.id] = alert
+            self._keys[key] = alert.id
+            self._by_user[user].add(alert.id)
+            return alert.id
+
+    # Add many (user, karat, direction, threshold) alerts with one re-sort per
+    # touched index instead of one list insert each; returns their ids
+    def add_many(self, rows):
+        ids = []
+        with self._lock:
+            touched = set()
+            for user, karat, direction, threshold in rows:
+                if direction not in (ABOVE, BELOW):
+                    raise ValueError(f"unknown direction: {direction}")
+                threshold = round(float(threshold), 2)
+                key = (user, karat, direction, threshold)
+                if key in self._keys:
+                    ids.append(self._keys[key])
+                    continue
+                alert = Alert(next(self._ids), user, karat, direction, threshold)
+                index = self._indexes[(karat, direction)]
+                index.thresholds.append(threshold)
+                index.ids.append(alert.id)
+                touched.add((karat, direction))
+                self._alerts[alert.id] = alert
+                self._keys[key] = alert.id
+                self._by_user[user].add(alert.id)
+                ids.append(alert.id)
+            for index_key in touched:
+                index = self._indexes[index_key]
+                pairs = sorted(zip(index.thresholds, index.ids))
+                index.thresholds = [threshold for threshold, _ in pairs]
+                index.ids = [alert_id for _, alert_id in pairs]
+        return ids
+
+    # Alert on a percent move from reference_price (e.g. +5 or -3)
+    def add_percent(self, user, karat, percent, reference_price):
+        direction = ABOVE if percent > 0 else BELOW
+        return self.add(user, karat, direction, reference_price * (1 + percent / 100))
+
+    def remove(self, alert_id):
+        with self._lock:
+            alert = self._alerts.pop(alert_id, None)
+            if alert is None:
+                return False
+            self._drop(alert)
+            index = self._indexes[(alert.karat, alert.direction)]
+            position = bisect.bisect_left(index.thresholds, alert.threshold)
+            while index.ids[position] != alert_id:
+                position += 1
+            del index.thresholds[position]
+            del index.ids[position]
+            return True
+
+    def alerts(self, user=None):
+        with self._lock:
+            if user is None:
+                return list(self._alerts.values())
+            return sorted((self._alerts[i] for i in self._by_user.get(user, ())), key=lambda a: a.id)
+
+    # Check a quote (karat -> price), notify and return the alerts that fired
+    def on_tick(self, prices):
+        fired = []
+        with self._lock:
+            self.ticks += 1
+            for karat, price in prices.items():
+                above = self._indexes.get((karat, ABOVE))
+                if above is not None and above.ids:
+                    end = bisect.bisect_right(above.thresholds, price)
+                    fired += self._pop(above, 0, end)
+                below = self._indexes.get((karat, BELOW))
+                if below is not None and below.ids:
+                    start = bisect.bisect_left(below.thresholds, price)
+                    fired += self._pop(below, start, len(below.ids))
+            for alert in fired:
+                self._held[alert.user].append(alert)
+            now = self._clock()
+            ready = [user for user in self._held if now - self._last_sent.get(user, float("-inf")) >= self.min_interval]
+            outgoing = []
+            for user in ready:
+                self._last_sent[user] = now
+                outgoing.append(Notification(user, tuple(self._held.pop(user)), dict(prices), time.time()))
+        for notification in outgoing:
+            self.sink.send(notification)
+        return fired
+
+    # Poll quote() every `interval` seconds on a background thread; a None
+    # quote (no real price available) is skipped
+    def start(self, quote, interval=30.0):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, args=(quote, interval), name="alert-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self, quote, interval):
+        while not self._stop.is_set():
+            try:
+                prices = quote()
+                if prices is not None:
+                    self.on_tick(prices)
+            except Exception:
+                self.errors += 1
+            self._stop.wait(interval)
+
+    # Caller must hold the lock
+    def _pop(self, index, start, end):
+        ids = index.ids[start:end]
+        del index.thresholds[start:end]
+        del index.ids[start:end]
+        alerts = [self._alerts.pop(alert_id) for alert_id in ids]
+        for alert in alerts:
+            self._drop(alert)
+        return alerts
+
+    # Caller must hold the lock
+    def _drop(self, alert):
+        self._keys.pop((alert.user, alert.karat, alert.direction, alert.threshold), None)
+        user_ids = self._by_user.get(alert.user)
+        if user_ids is not None:
+            user_ids.discard(alert.id)
+            if not user_ids:
+                del self._by_user[alert.user]
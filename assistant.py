@@ -0,0 +1,140 @@
+# "Ask About Gold" helpers: intent routing, LLM response cache and request batching
+#
+# route_query() matches Arabic/English questions with precompiled patterns and
+# pulls out amounts and months. Free-form questions go to the language model
+# through one LLMBatcher per process, which groups concurrent prompts into a
+# single batch call; answers are cached by normalized question.
+import queue
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+
+from market_cache import MarketCache
+from metrics import metrics
+
+Intent = namedtuple("Intent", "name amount months")
+
+ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹٫٬", "01234567890123456789.,")
+_DIACRITICS = re.compile(r"[\u064b-\u0652\u0640]")  # tashkeel and tatweel
+_ALEF = re.compile(r"[أإآ]")
+_PUNCTUATION = re.compile(r"[^\w\s.,%]|(?<!\d)[.,]|[.,](?!\d)")
+_SPACES = re.compile(r"\s+")
+
+# A money amount is mentioned: a currency, or "with/for/بـ" before a number
+_MONEY = r"(?=.*(?:\begp\b|\bpounds?\b|جنيه|\b(?:with|for) \d|(?<!\w)ب \d))"
+
+# Checked in order; the first match wins. Arabic stems start a word, after an
+# optional conjunction or verb prefix (so "متوفر", available, is not "وفر", save).
+# Intents in AMOUNT_INTENTS only match questions that contain an amount.
+INTENT_PATTERNS = [
+    ("savings", re.compile(r"(?<!\w)[وف]?[اين]?(دخر|وفر)|(?<!\w)(و|ال|بال|لل)?(ادخار|توفير)|\bsav(e|es|ing|ings)\b")),
+    ("purchase", re.compile(r"(?<!\w)كم (ذهب|جرام)|\bhow (much|many) (gold|grams?)\b"
+                            r"|^(?=.*(?:(?<!\w)[وف]?اشتري|\bbuy\b))" + _MONEY)),
+    ("change", re.compile(r"تغير|تغيير|\bchanges?\b")),
+    ("news", re.compile(r"اخبار|خبر|\bnews\b")),
+    ("price", re.compile(r"سعر|اسعار|\bprices?\b|\bcost\b")),
+]
+AMOUNT_INTENTS = {"savings", "purchase"}
+_AMOUNT = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(k\b|الف|thousand\b)?")
+_KARAT = re.compile(r"\b(18|21|22|24)\s*(k|قيراط)(?!\w)|عيار\s*(18|21|22|24)\b")
+_MONTHS = re.compile(r"(\d+)\s*(months?\b|شهر|شهور|اشهر)|(\d+)\s*(years?\b|سنه|سنوات|سنين|عام|اعوام)")
+# Dual forms carry their own count: two months, two years
+_DUAL_MONTHS = {"شهرين": 2, "سنتين": 24, "عامين": 24}
+_DUAL = re.compile(r"(?<!\w)[لب]?(شهرين|سنتين|عامين)(?!\w)")
+# Years ("in 2024", "عام 2024") are not amounts, unless a currency follows
+_YEAR = re.compile(r"(\b(in|since|by|until|year)|(?<!\w)(عام|سنه|في|حتي))\s+(19|20)\d\d\b(?!\s*(egp|pounds?|جنيه))")
+
+RESPONSE_TTL = 3600
+
+
+# Lowercase, unify Arabic letter forms and digits, drop punctuation and extra spaces
+def normalize_query(text):
+    text = text.translate(ARABIC_DIGITS).lower()
+    text = _DIACRITICS.sub("", text)
+    text = _ALEF.sub("ا", text).replace("ى", "ي").replace("ة", "ه")
+    text = _PUNCTUATION.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+# Intent name ("savings", "purchase", "change", "news", "price" or None) with any amount and months.
+# A savings or purchase question without an amount ("should I save in gold?")
+# falls through to the later intents, or to the language model.
+def route_query(query):
+    text = normalize_query(query)
+    question = text
+    months = None
+    match = _MONTHS.search(text)
+    if match:
+        months = int(match.group(1)) if match.group(1) else int(match.group(3)) * 12
+        text = text[:match.start()] + text[match.end():]
+    else:
+        match = _DUAL.search(text)
+        if match:
+            months = _DUAL_MONTHS[match.group(1)]
+    text = _YEAR.sub(" ", _KARAT.sub(" ", text))
+    # The largest number is the money amount (others are usually karats or quantities)
+    amounts = [float(m.group(1).replace(",", "")) * (1000 if m.group(2) else 1) for m in _AMOUNT.finditer(text)]
+    amount = max(amounts) if amounts else None
+    name = next((name for name, pattern in INTENT_PATTERNS
+                 if (amount is not None or name not in AMOUNT_INTENTS) and pattern.search(question)), None)
+    return Intent(name, amount, months)
+
+
+# Collects prompts from concurrent sessions and sends them to the model in
+# batches of up to max_batch, waiting at most max_wait seconds to fill one
+class LLMBatcher:
+    def __init__(self, llm, max_batch=8, max_wait=0.02):
+        self.llm = llm
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self._thread.start()
+
+    # Future for the model's answer to prompt
+    def submit(self, prompt):
+        future = Future()
+        self._queue.put((prompt, future))
+        return future
+
+    def __call__(self, prompt, timeout=None):
+        return self.submit(prompt).result(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.max_wait))
+            except queue.Empty:
+                pass
+            prompts = [prompt for prompt, _ in batch]
+            try:
+                with metrics.span("upstream.huggingface"):
+                    if hasattr(self.llm, "batch"):
+                        results = self.llm.batch(prompts, return_exceptions=True)
+                    else:
+                        results = [self._invoke(prompt) for prompt in prompts]
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _invoke(self, prompt):
+        try:
+            return self.llm.invoke(prompt) if hasattr(self.llm, "invoke") else self.llm(prompt)
+        except Exception as e:
+            return e
+
+
+# Model answers by normalized question, shared by all sessions
+response_cache = MarketCache(ttls={"llm": RESPONSE_TTL}, stale_for={"llm": 0}, max_entries=1024)
+
+
+# Cached model answer; identical questions asked concurrently share one call
+def ask_llm(llm, query, timeout=60):
+    return response_cache.get("llm", normalize_query(query), lambda: llm(query, timeout))
@@ -0,0 +1,111 @@
+# Savings-plan backtests and projections for monthly gold purchases
+#
+# dca_backtest() runs a monthly plan from every historical start month at
+# once and monte_carlo() projects it over thousands of simulated price paths;
+# both are single NumPy passes. scenario_sweep() spreads large
+# amount x months x karat grids over a process pool.
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from conversion import price_matrix
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+# First bar of each calendar month (the monthly purchase day)
+def month_start(frame):
+    return frame.groupby(frame.index.to_period("M")).first()
+
+
+# Buy monthly_amount of gold every month for `months` months, starting from
+# every possible historical month. prices are monthly prices per gram.
+# Returns one entry per start month: grams bought, their value at the last
+# purchase and the return on the money invested.
+def dca_backtest(prices, monthly_amount, months):
+    prices = np.asarray(prices, dtype="f8")
+    if months <= 0 or len(prices) < months:
+        empty = np.empty(0)
+        return {"start": np.empty(0, dtype=int), "grams": empty, "value": empty, "return_pct": empty}
+    cum_grams_per_unit = np.concatenate([[0.0], np.cumsum(1 / prices)])
+    grams = monthly_amount * (cum_grams_per_unit[months:] - cum_grams_per_unit[:-months])
+    value = grams * prices[months - 1:]
+    invested = monthly_amount * months
+    return {
+        "start": np.arange(len(grams)),
+        "grams": grams,
+        "value": value,
+        "return_pct": (value / invested - 1) * 100,
+    }
+
+
+# Project the plan over n_paths simulated monthly price paths starting at
+# start_price. "bootstrap" resamples historical monthly log returns; "gbm"
+# draws them from a normal fit of those returns. Returns percentile bands of
+# the grams accumulated after each month, and every path's final grams.
+def monte_carlo(prices, monthly_amount, months, start_price=None, n_paths=5000,
+                method="bootstrap", percentiles=PERCENTILES, seed=None):
+    if n_paths < 1 or months < 1:
+        raise ValueError("n_paths and months must be at least 1")
+    prices = np.asarray(prices, dtype="f8")
+    log_returns = np.diff(np.log(prices))
+    if start_price is None:
+        start_price = prices[-1]
+    rng = np.random.default_rng(seed)
+    shape = (n_paths, months - 1)
+    if method == "bootstrap":
+        steps = rng.choice(log_returns, size=shape)
+    elif method == "gbm":
+        steps = rng.normal(log_returns.mean(), log_returns.std(ddof=1), size=shape)
+    else:
+        raise ValueError(f"unknown method: {method}")
+    paths = start_price * np.exp(np.concatenate([np.zeros((n_paths, 1)), np.cumsum(steps, axis=1)], axis=1))
+    grams = np.cumsum(monthly_amount / paths, axis=1)
+    return {
+        "percentiles": list(percentiles),
+        "bands": np.percentile(grams, percentiles, axis=0),
+        "final_grams": grams[:, -1],
+    }
+
+
+# Share of outcomes that reach the goal (grams)
+def goal_probability(grams, goal):
+    grams = np.asarray(grams)
+    return float((grams >= goal).mean()) if len(grams) else 0.0
+
+
+# One sweep cell: backtest every amount for one karat and horizon. Grams are
+# linear in the monthly amount, so the backtest runs once per cell.
+def _sweep_cell(task):
+    usd_per_oz, usd_egp, karat, months, amounts, goal = task
+    prices = price_matrix(usd_per_oz, {"EGP": usd_egp}, karats=[karat], units=["gram"], currencies=["EGP"]).values[:, 0, 0, 0]
+    per_unit = dca_backtest(prices, 1.0, months)["grams"]
+    if not len(per_unit):
+        return []
+    grams = np.outer(amounts, per_unit)
+    bands = np.percentile(grams, PERCENTILES, axis=1)
+    rows = []
+    for i, amount in enumerate(amounts):
+        row = {"karat": karat, "months": months, "monthly_amount": amount, "starts": len(per_unit)}
+        row.update({f"p{p}_grams": bands[j, i] for j, p in enumerate(PERCENTILES)})
+        if goal is not None:
+            row["goal_probability"] = goal_probability(grams[i], goal)
+        rows.append(row)
+    return rows
+
+
+# Backtest an amounts x months x karats grid on a process pool. usd_per_oz
+# and usd_egp are month-start gold prices and exchange rates. Workers are
+# spawned, not forked, since callers (Streamlit, aiohttp) run other threads.
+def scenario_sweep(usd_per_oz, usd_egp, amounts, months_options, karats, goal=None, max_workers=None):
+    usd_per_oz = np.asarray(usd_per_oz, dtype="f8")
+    usd_egp = np.asarray(usd_egp, dtype="f8")
+    amounts = np.asarray(amounts, dtype="f8")
+    tasks = [(usd_per_oz, usd_egp, karat, months, amounts, goal) for karat in karats for months in months_options]
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        cells = list(pool.map(_sweep_cell, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    return pd.DataFrame([row for cell in cells for row in cell])
@@ -0,0 +1,79 @@
+# Throughput of the batch PDF statement renderer (reports per second)
+#
+# Builds synthetic portfolios in a temporary ledger, renders one statement per
+# portfolio on the process pool and prints reports/s and peak memory.
+#   python benchmarks/report_throughput.py --portfolios 200 --lots 100 --workers 4
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversion import KARATS  # noqa: E402
+from ledger import BUY, Ledger  # noqa: E402
+from reports import ReportRenderer, build_statements  # noqa: E402
+
+
+def synthetic_ledger(path, n_portfolios, n_lots, seed=0):
+    rng = np.random.default_rng(seed)
+    ledger = Ledger(path)
+    start = pd.Timestamp("2024-01-01")
+    rows = []
+    for i in range(n_portfolios):
+        portfolio_id = ledger.create_portfolio("bench", f"portfolio {i}")
+        days = np.sort(rng.integers(0, 700, n_lots))
+        for day in days:
+            rows.append({"portfolio_id": portfolio_id, "side": BUY, "grams": round(rng.uniform(1, 20), 2),
+                         "price": round(rng.uniform(2500, 4500), 2), "karat": "21K",
+                         "ts": start + pd.Timedelta(days=int(day))})
+    ledger.import_lots(pd.DataFrame(rows))
+    return ledger
+
+
+def synthetic_history(days=730):
+    dates = pd.bdate_range(end="2025-12-31", periods=days)
+    price_21k = 3000 * np.exp(np.cumsum(np.random.default_rng(1).normal(0, 0.01, days)))
+    return pd.DataFrame({k: price_21k * purity / KARATS["21K"] for k, purity in KARATS.items()}, index=dates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--portfolios", type=int, default=200)
+    parser.add_argument("--lots", type=int, default=100, help="lots per portfolio")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--language", choices=["en", "ar"], default="en")
+    parser.add_argument("--bytes", action="store_true", help="return reports as bytes instead of writing files")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = synthetic_ledger(os.path.join(tmp, "bench.db"), args.portfolios, args.lots)
+        history = synthetic_history()
+        prices = {k: float(history[k].iloc[-1]) for k in history.columns}
+
+        t0 = time.perf_counter()
+        statements = build_statements(ledger, ledger.portfolios("bench"), prices, history, language=args.language)
+        t1 = time.perf_counter()
+        renderer = ReportRenderer(args.workers)
+        renderer.submit(statements[:1]).results()  # start the workers
+        t2 = time.perf_counter()
+        job = renderer.submit(statements, None if args.bytes else os.path.join(tmp, "reports"))
+        results = job.results()
+        t3 = time.perf_counter()
+        renderer.shutdown()
+
+        size = sum(len(r) if args.bytes else os.path.getsize(r) for r in results)
+        print(f"statements built: {len(statements)} in {t1 - t0:.2f}s")
+        print(f"rendered: {len(results)} reports, {size / len(results) / 1024:.1f} KiB each, in {t3 - t2:.2f}s")
+        print(f"throughput: {len(results) / (t3 - t2):.1f} reports/s")
+        print(f"peak memory: parent {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB, "
+              f"largest worker {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# Offline latency of full page reruns and of the functions behind them
+#
+# Upstream responses are replayed from fixtures (see fixtures.py), so no
+# network or API keys are needed and runs are comparable between commits.
+# Without --fixtures a synthetic fixture set is generated in a scratch
+# directory; the app's data files also go to a scratch directory.
+#   GOLD_FIXTURES=record streamlit run test.py          # optional: record real responses first
+#   python benchmarks/rerun_latency.py --runs 20 --fixtures data/fixtures --json bench.json
+#   python benchmarks/rerun_latency.py --baseline bench.json --tolerance 0.25   # exit 1 on regressions
+import argparse
+import io
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# core reads GOLD_DATA_DIR at import time
+SCRATCH = tempfile.mkdtemp(prefix="gold-bench-")
+os.environ.setdefault("GOLD_DATA_DIR", os.path.join(SCRATCH, "data"))
+
+from assistant import route_query  # noqa: E402
+from core import API_KEYS, DATA_DIR, GoldCore, savings_plan  # noqa: E402
+from fixtures import RECORD, REPLAY, Fixtures  # noqa: E402
+from market_cache import market_cache  # noqa: E402
+from metrics import metrics  # noqa: E402
+from news import NEWS_API_URL  # noqa: E402
+from reports import build_statements, find_font, render_statement  # noqa: E402
+from report_throughput import synthetic_history, synthetic_ledger  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.py")
+SECRETS = {key: f"bench-{key.lower()}" for key in API_KEYS + ("HUGGINGFACE_API_KEY",)}
+QUERIES = ["كم سعر الذهب اليوم؟", "عايز أوفر 1500 جنيه شهريا لمدة سنتين", "اشتري ذهب عيار 21 بـ 10,000 جنيه",
+           "آخر أخبار الذهب", "ما هو أفضل وقت لشراء الذهب؟"]
+
+
+# Yahoo quote and history, exchange rates, Alpha Vantage, NewsAPI and model answers
+def synthetic_fixtures(directory, days=750):
+    fixtures = Fixtures(directory, RECORD, SECRETS.values())
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    for symbol, start in (("GC=F", 1900.0), ("EGP=X", 30.0)):
+        close = start * np.exp(np.cumsum(rng.normal(0.0005, 0.01, days)))
+        bars = pd.DataFrame({"Open": close, "High": close * 1.005, "Low": close * 0.995, "Close": close,
+                             "Volume": 0}, index=pd.DatetimeIndex(dates, name="Date"))
+        fixtures.add_call("yahoo_history", (symbol, None), bars)
+    fixtures.add_call("yahoo", (), 2350.0)
+    fixtures.add_call("huggingface", (QUERIES[-1],), "اشتر على دفعات شهرية لتقليل أثر تقلب الأسعار.")
+    fixtures.add_http("GET", f"https://v6.exchangerate-api.com/v6/{SECRETS['EXCHANGE_RATE_API_KEY']}/latest/USD",
+                      json.dumps({"result": "success", "conversion_rates": {"USD": 1.0, "EGP": 48.5, "EUR": 0.92,
+                                                                            "SAR": 3.75, "AED": 3.67}}))
+    fixtures.add_http("GET", "https://www.alphavantage.co/query?function=CURRENCY_EXCHANGE_RATE&from_currency=XAU"
+                             f"&to_currency=USD&apikey={SECRETS['ALPHA_VANTAGE_API_KEY']}",
+                      json.dumps({"Realtime Currency Exchange Rate": {"5. Exchange Rate": "2351.5"}}))
+    articles = [{"title": f"Gold market update {i}", "description": "Gold prices in Egypt and worldwide",
+                 "url": f"https://example.com/gold/{i}", "publishedAt": (dates[-1] - pd.Timedelta(hours=i)).isoformat() + "Z",
+                 "source": {"name": "Example"}} for i in range(100)]
+    fixtures.add_http("GET", f"{NEWS_API_URL}?q=gold+egypt&sortBy=publishedAt&pageSize=100",
+                      json.dumps({"status": "ok", "totalResults": len(articles), "articles": articles}))
+
+
+def percentiles(samples):
+    p50, p95 = np.percentile(np.array(samples) * 1000, [50, 95])
+    return float(p50), float(p95)
+
+
+# p50/p95 of fn() over `runs` calls (after one warm-up), and its allocation peak
+def measure(fn, runs, setup=None):
+    samples = []
+    for _ in range(runs + 1):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    p50, p95 = percentiles(samples[1:])
+    return {"runs": runs, "p50_ms": p50, "p95_ms": p95, "peak_kib": peak / 1024}
+
+
+# Cold first run, then `runs` warm reruns of the whole Streamlit script
+def measure_reruns(runs):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP, default_timeout=120)
+    for key, value in SECRETS.items():
+        app.secrets[key] = value
+    start = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(f"page failed: {app.exception[0].message}")
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - start)
+    p50, p95 = percentiles(samples)
+    return {"cold_ms": cold * 1000, "runs": runs, "p50_ms": p50, "p95_ms": p95}
+
+
+def measure_functions(runs, fixtures_dir):
+    core = GoldCore(SECRETS, os.path.join(SCRATCH, "core"))
+    Fixtures(fixtures_dir, REPLAY, SECRETS.values()).install()
+    price = core.current_price()["egp_per_gram_21k"]
+    monthly_prices = core.monthly_prices_egp()
+    ledger = synthetic_ledger(os.path.join(SCRATCH, "ledger.db"), 5, 100)
+    history = synthetic_history()
+    prices = {k: float(history[k].iloc[-1]) for k in history.columns}
+    statement = build_statements(ledger, ledger.portfolios("bench"), prices, history)[0]
+    font_path = find_font()
+    store = core.news_poller.store
+    core.news_poller.fetch_once()
+    return {
+        "core.current_price (cold cache)": measure(core.current_price, runs, setup=market_cache.clear),
+        "core.indicators": measure(core.indicators, runs),
+        "core.karat_history_egp 1y": measure(lambda: core.karat_history_egp("1y"), runs),
+        "savings_plan projection": measure(lambda: savings_plan(1500, 24, price, monthly_prices, goal=50), runs),
+        "reports.build_statements": measure(lambda: build_statements(ledger, ledger.portfolios("bench"), prices, history), runs),
+        "reports.render_statement": measure(lambda: render_statement(statement, io.BytesIO(), font_path), runs),
+        "news.search": measure(lambda: store.search("gold egypt"), runs),
+        "assistant.route_query": measure(lambda: [route_query(query) for query in QUERIES], runs),
+    }
+
+
+def print_table(results):
+    print(f"{'':34} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'peak KiB':>9}")
+    for name, result in results.items():
+        peak = f"{result['peak_kib']:9.0f}" if "peak_kib" in result else f"{'':9}"
+        print(f"{name:34} {result['runs']:5d} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {peak}")
+
+
+# Names whose p50 got slower than the baseline by more than `tolerance` (a fraction)
+def regressions(results, baseline, tolerance):
+    return [f"{name}: p50 {result['p50_ms']:.2f} ms vs {baseline[name]['p50_ms']:.2f} ms"
+            for name, result in results.items()
+            if name in baseline and result["p50_ms"] > baseline[name]["p50_ms"] * (1 + tolerance)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline page rerun and function latency")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--fixtures", default=None, help="recorded fixtures directory (default: synthetic)")
+    parser.add_argument("--no-page", action="store_true", help="skip the Streamlit reruns")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--baseline", default=None, help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown vs the baseline")
+    args = parser.parse_args()
+
+    try:
+        fixtures_dir = args.fixtures
+        if fixtures_dir is None:
+            fixtures_dir = os.path.join(SCRATCH, "fixtures")
+            synthetic_fixtures(fixtures_dir)
+        os.environ["GOLD_FIXTURES"] = REPLAY
+        os.environ["GOLD_FIXTURES_DIR"] = fixtures_dir
+
+        results = {}
+        if not args.no_page:
+            results["page rerun"] = page = measure_reruns(args.runs)
+            print(f"page: cold run {page['cold_ms']:.0f} ms (data dir {DATA_DIR})")
+        results.update(measure_functions(args.runs, fixtures_dir))
+        print_table(results)
+        print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+        print("\nspans (all runs):")
+        for name, summary in metrics.summary().items():
+            print(f"  {name:32} {summary['count']:5d} calls  p50 {summary['p50_ms']:8.2f} ms  "
+                  f"p95 {summary['p95_ms']:8.2f} ms  errors {summary['errors']}")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=1)
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                slower = regressions(results, json.load(f), args.tolerance)
+            for line in slower:
+                print(f"REGRESSION {line}")
+            if slower:
+                sys.exit(1)
+    finally:
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Gold price conversion: USD per troy ounce -> price per karat, unit and currency
+#
+# price_matrix() converts a whole price series in one NumPy broadcast, giving
+# an array of shape (prices, karats, units, currencies). Adding a karat, unit
+# or currency only adds a row to the tables below.
+import numpy as np
+import pandas as pd
+
+TROY_OUNCE_GRAMS = 31.1035
+
+# Gold content per karat
+KARATS = {
+    "24K": 24 / 24,
+    "22K": 22 / 24,
+    "21K": 21 / 24,
+    "18K": 18 / 24,
+}
+
+# Grams per unit; the gold pound (جنيه ذهب) coin weighs 8 grams and is sold as 21K
+UNITS = {
+    "gram": 1.0,
+    "ounce": TROY_OUNCE_GRAMS,
+    "gold_pound": 8.0,
+}
+
+# Currencies included by default when the FX rates have them
+DEFAULT_CURRENCIES = ("EGP", "USD", "EUR", "SAR", "AED")
+
+
+class PriceMatrix:
+    def __init__(self, values, karats, units, currencies, index=None):
+        self.values = values
+        self.karats = list(karats)
+        self.units = list(units)
+        self.currencies = list(currencies)
+        self.index = index
+
+    def __len__(self):
+        return len(self.values)
+
+    # Price series for one karat/unit/currency
+    def get(self, karat="21K", unit="gram", currency="EGP"):
+        column = self.values[:, self.karats.index(karat), self.units.index(unit), self.currencies.index(currency)]
+        return column if self.index is None else pd.Series(column, index=self.index)
+
+    # Karat x unit table for one row (the latest by default)
+    def table(self, currency="EGP", row=-1):
+        return pd.DataFrame(
+            self.values[row, :, :, self.currencies.index(currency)],
+            index=self.karats, columns=self.units,
+        )
+
+
+# Price per unit for every karat, given the price of one karat (e.g. a manual 21K price)
+def karat_prices(price, karat="21K"):
+    return {k: price * purity / KARATS[karat] for k, purity in KARATS.items()}
+
+
+# Convert USD/oz prices to every karat, unit and currency in one pass.
+# rates maps currency -> USD rate, either a scalar or one rate per price.
+def price_matrix(usd_per_oz, rates, karats=None, units=None, currencies=None):
+    index = usd_per_oz.index if isinstance(usd_per_oz, pd.Series) else None
+    usd = np.atleast_1d(np.asarray(usd_per_oz, dtype="f8"))
+    karats = list(KARATS if karats is None else karats)
+    units = list(UNITS if units is None else units)
+    if currencies is None:
+        currencies = [c for c in DEFAULT_CURRENCIES if c in rates]
+    fx = np.stack([np.broadcast_to(np.asarray(rates[c], dtype="f8"), usd.shape) for c in currencies], axis=-1)
+    purity = np.array([KARATS[k] for k in karats])
+    grams = np.array([UNITS[u] for u in units])
+    factors = purity[:, None] * grams[None, :] / TROY_OUNCE_GRAMS
+    values = usd[:, None, None, None] * factors[None, :, :, None] * fx[:, None, None, :]
+    return PriceMatrix(values, karats, units, currencies, index=index)
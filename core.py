@@ -0,0 +1,366 @@
+# Headless application core: prices, conversion, calculators, portfolios and alerts
+#
+# Everything the Streamlit page (test.py) and the HTTP service (service.py)
+# share lives here, with no Streamlit dependency. One GoldCore per process
+# owns the history stores, indicator engine, ledger, alert engine and news
+# poller; upstream calls go through the shared provider pool and market
+# cache. Upstream problems come back as (level, message) pairs next to a
+# fallback value, for the caller to show or log; quotes built on a fallback
+# are flagged with "fallback" so nothing acts on a price nobody quoted.
+import os
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+import pandas as pd
+import requests
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+from alerts import AlertEngine, MemorySink
+from backtest import month_start, dca_backtest, monte_carlo, goal_probability
+from conversion import KARATS, UNITS, price_matrix
+from history_store import HistoryStore, BACKFILL_PERIOD, asof_values
+from indicators import IndicatorEngine
+from ledger import Ledger
+from market_cache import market_cache
+from metrics import metrics
+from news import NewsStore, NewsPoller
+from providers import providers, CircuitOpenError
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get("GOLD_DATA_DIR", os.path.join(BASE_DIR, "data"))
+SECRETS_PATH = os.path.join(BASE_DIR, ".streamlit", "secrets.toml")
+API_KEYS = ("ALPHA_VANTAGE_API_KEY", "NEWS_API_KEY", "EXCHANGE_RATE_API_KEY")
+
+# Upstream deadlines in seconds. The quote asks Alpha Vantage too when Yahoo
+# has not answered after QUOTE_HEDGE_AFTER seconds.
+YAHOO_DEADLINE = 4.0
+ALPHA_VANTAGE_DEADLINE = 5.0
+EXCHANGE_RATE_DEADLINE = 5.0
+HISTORY_DEADLINE = 20.0
+QUOTE_HEDGE_AFTER = 1.5
+QUOTE_DEADLINE = max(YAHOO_DEADLINE, QUOTE_HEDGE_AFTER + ALPHA_VANTAGE_DEADLINE)
+
+# Fallbacks when no upstream answers
+DEFAULT_USD_PER_OZ = 2000.0
+DEFAULT_USD_RATES = {"USD": 1.0, "EGP": 47.5}
+RATES_FALLBACK_MESSAGE = ("warning", "تعذر جلب سعر الصرف. يتم استخدام 47.5 جنيه/دولار")
+
+# Upstream errors that fall back to defaults instead of failing the caller
+# (futures raise their own TimeoutError before Python 3.11)
+UPSTREAM_ERRORS = (requests.RequestException, KeyError, ValueError, TimeoutError, FutureTimeoutError, CircuitOpenError)
+
+ALERT_POLL_INTERVAL = 30
+
+
+# API keys from .streamlit/secrets.toml, overridden by environment variables
+# (before Python 3.11 the file is read only when tomli is installed)
+def load_config(path=SECRETS_PATH):
+    config = {}
+    if tomllib is not None and os.path.exists(path):
+        with open(path, "rb") as f:
+            config.update(tomllib.load(f))
+    config.update({key: os.environ[key] for key in API_KEYS if key in os.environ})
+    return config
+
+
+# Amount as typed by a user ("1,500", "1500ج"); raises ValueError
+def parse_amount(text):
+    return float(str(text).replace("ج", "").replace(",", ""))
+
+
+# Grams of gold that `amount` buys at price_per_gram
+def purchase_grams(amount, price_per_gram):
+    if amount <= 0:
+        raise ValueError("amount must be greater than 0")
+    return amount / price_per_gram
+
+
+# Monthly savings plan at today's price. With monthly price history, also the
+# same plan started in every past month (backtest) and simulated forward from
+# today's price (projection); with a goal (grams), the chance of reaching it.
+@metrics.timed("core.savings_plan")
+def savings_plan(monthly_amount, months, price_per_gram, monthly_prices=None, goal=None, n_paths=5000):
+    if monthly_amount <= 0 or months <= 0:
+        raise ValueError("monthly amount and months must be greater than 0")
+    total_amount = monthly_amount * months
+    plan = {
+        "monthly_amount": monthly_amount,
+        "months": months,
+        "total_amount": total_amount,
+        "grams": total_amount / price_per_gram,
+    }
+    if monthly_prices is not None and len(monthly_prices) > 1:
+        plan["backtest"] = dca_backtest(monthly_prices, monthly_amount, months)
+        plan["projection"] = monte_carlo(monthly_prices, monthly_amount, months, start_price=price_per_gram, n_paths=n_paths)
+        if goal is not None:
+            plan["backtest_goal_probability"] = goal_probability(plan["backtest"]["grams"], goal)
+            plan["goal_probability"] = goal_probability(plan["projection"]["final_grams"], goal)
+    return plan
+
+
+class GoldCore:
+    def __init__(self, config, data_dir=DATA_DIR):
+        self.config = config
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        # Registering again (another core, a Streamlit rerun) only refreshes
+        # the functions; breaker state is kept
+        providers.register("yahoo", self._yahoo_quote, YAHOO_DEADLINE)
+        providers.register("alpha_vantage", self._alpha_vantage_quote, ALPHA_VANTAGE_DEADLINE)
+        providers.register("exchange_rate", self._exchange_rates, EXCHANGE_RATE_DEADLINE)
+        providers.register("yahoo_history", self._yahoo_history, HISTORY_DEADLINE)
+        self.history_store = HistoryStore(os.path.join(data_dir, "GC=F.npy"), self._fetch_gold_history,
+                                          seed_path=os.path.join(data_dir, "GC=F_seed.csv"))
+        self.fx_store = HistoryStore(os.path.join(data_dir, "EGP=X.npy"), self._fetch_fx_history,
+                                     seed_path=os.path.join(data_dir, "EGP=X_seed.csv"))
+        self.indicator_engine = IndicatorEngine()
+        self._indicator_lock = threading.Lock()
+        self._indicator_fx = None
+        self._lock = threading.Lock()
+        self._ledger = None
+        self._alert_engine = None
+        self._news_poller = None
+
+    # Upstream fetchers (run on the provider pool)
+
+    # USD exchange rates (all currencies) from ExchangeRate-API
+    def _exchange_rates(self):
+        url = f"https://v6.exchangerate-api.com/v6/{self.config.get('EXCHANGE_RATE_API_KEY')}/latest/USD"
+        response = providers.session.get(url, timeout=EXCHANGE_RATE_DEADLINE)
+        response.raise_for_status()
+        data = response.json()
+        if "EGP" not in data.get("conversion_rates", {}):
+            raise ValueError("لا توجد أسعار صرف في الرد")
+        return data["conversion_rates"]
+
+    # Gold price in USD/oz from Yahoo Finance (GC=F futures)
+    def _yahoo_quote(self):
+        hist = providers.ticker("GC=F").history(period="1d", timeout=YAHOO_DEADLINE)
+        if hist.empty:
+            raise ValueError("لا توجد بيانات من Yahoo Finance")
+        return float(hist["Close"].iloc[-1])
+
+    # Gold price in USD/oz from Alpha Vantage
+    def _alpha_vantage_quote(self):
+        url = f"https://www.alphavantage.co/query?function=CURRENCY_EXCHANGE_RATE&from_currency=XAU&to_currency=USD&apikey={self.config.get('ALPHA_VANTAGE_API_KEY')}"
+        response = providers.session.get(url, timeout=ALPHA_VANTAGE_DEADLINE)
+        response.raise_for_status()
+        data = response.json()
+        if "Realtime Currency Exchange Rate" not in data:
+            raise KeyError("البيانات المتوقعة غير موجودة في رد Alpha Vantage")
+        return float(data["Realtime Currency Exchange Rate"]["5. Exchange Rate"])
+
+    # Daily bars of a Yahoo Finance symbol from `start` (ISO date), or the initial backfill
+    def _yahoo_history(self, symbol, start):
+        ticker = providers.ticker(symbol)
+        if start is None:
+            return ticker.history(period=BACKFILL_PERIOD, timeout=HISTORY_DEADLINE)
+        return ticker.history(start=start, timeout=HISTORY_DEADLINE)
+
+    def _fetch_gold_history(self, start):
+        return providers.call("yahoo_history", "GC=F", start)
+
+    def _fetch_fx_history(self, start):
+        return providers.call("yahoo_history", "EGP=X", start)
+
+    def _fetch_usd_rates(self):
+        return providers.call("exchange_rate")
+
+    # Gold price in USD/oz: Yahoo Finance, hedged with Alpha Vantage, then a default
+    # (flagged as a fallback)
+    def _fetch_gold_quote(self):
+        messages = []
+        fallback = False
+        try:
+            usd_per_oz, source = providers.hedged("yahoo", "alpha_vantage", QUOTE_HEDGE_AFTER)
+            if source != "yahoo":
+                messages.append(("warning", "فشل Yahoo Finance أو تأخر. تم استخدام Alpha Vantage."))
+        except UPSTREAM_ERRORS as e:
+            messages.append(("error", f"فشل Yahoo Finance و Alpha Vantage: {str(e)}. استخدام قيمة افتراضية."))
+            usd_per_oz = DEFAULT_USD_PER_OZ
+            fallback = True
+        return {"usd_per_oz": usd_per_oz, "messages": messages, "fallback": fallback}
+
+    # Market data
+
+    # USD exchange rates (shared cache), or DEFAULT_USD_RATES; returns (rates, messages).
+    # Messages are only returned with the defaults.
+    def usd_rates(self):
+        try:
+            return market_cache.get("fx", "USD", self._fetch_usd_rates), []
+        except UPSTREAM_ERRORS:
+            return dict(DEFAULT_USD_RATES), [RATES_FALLBACK_MESSAGE]
+
+    # Gold quote in USD/oz (shared cache) with any upstream messages
+    def quote(self):
+        return market_cache.get("quote", "GC=F", self._fetch_gold_quote)
+
+    # Quote converted to every karat, unit and currency. The quote and the
+    # exchange rates are fetched concurrently, so a cold call waits for the
+    # slower of the two, at most QUOTE_DEADLINE seconds.
+    @metrics.timed("core.current_price")
+    def current_price(self):
+        results = providers.gather({"quote": self.quote, "fx": self.usd_rates}, timeout=QUOTE_DEADLINE)
+        quote = results["quote"]
+        if isinstance(quote, Exception):
+            quote = {"usd_per_oz": DEFAULT_USD_PER_OZ, "messages": [("error", f"تعذر جلب سعر الذهب: {str(quote)}. استخدام قيمة افتراضية.")],
+                     "fallback": True}
+        rates, rate_messages = results["fx"] if not isinstance(results["fx"], Exception) else (dict(DEFAULT_USD_RATES), [RATES_FALLBACK_MESSAGE])
+        matrix = price_matrix(quote["usd_per_oz"], rates)
+        return {
+            "usd_per_oz": quote["usd_per_oz"],
+            "egp_per_gram_21k": matrix.get("21K", "gram", "EGP")[0],
+            "matrix": matrix,
+            "messages": quote["messages"] + rate_messages,
+            "fallback": quote["fallback"] or bool(rate_messages),
+        }
+
+    # EGP/gram price per karat from the cached quote (used by the alert engine),
+    # or None while the quote or the exchange rate is a fallback
+    def karat_prices_egp(self):
+        rates, rate_messages = self.usd_rates()
+        quote = self.quote()
+        if quote["fallback"] or rate_messages:
+            return None
+        matrix = price_matrix(quote["usd_per_oz"], rates, units=["gram"], currencies=["EGP"])
+        return {k: matrix.get(k, "gram", "EGP")[0] for k in matrix.karats}
+
+    # Value of `quantity` units of gold of a karat in a currency at the current
+    # quote, or at the prices of `matrix` (a price_matrix) when given
+    def convert(self, quantity=1.0, karat="21K", unit="gram", currency="EGP", matrix=None):
+        if karat not in KARATS or unit not in UNITS:
+            raise ValueError(f"unknown karat or unit: {karat}, {unit}")
+        if matrix is None:
+            matrix = self.current_price()["matrix"]
+        if currency not in matrix.currencies:
+            raise ValueError(f"unknown currency: {currency}")
+        price = matrix.get(karat, unit, currency)[0]
+        return {"karat": karat, "unit": unit, "currency": currency, "quantity": quantity,
+                "price": price, "value": price * quantity}
+
+    # History
+
+    # GC=F history for a period ("5d", "1y", ...), read from the local store.
+    # The store appends missing days at most once per "history" cache TTL.
+    def gold_history(self, period=None, start=None):
+        market_cache.get("history", "GC=F", self.history_store.sync)
+        return self.history_store.frame(period, start)
+
+    # GC=F history with the USD/EGP rate in effect on each day (USD_EGP column).
+    # Falls back to today's rate when no FX history is available.
+    @metrics.timed("core.gold_history_egp")
+    def gold_history_egp(self, period=None, start=None):
+        return self._with_fx(self.gold_history(period, start), self._fx_history())
+
+    # hist with a USD_EGP column from the FX history `fx`, or today's rate when it is None
+    def _with_fx(self, hist, fx):
+        if fx is not None:
+            hist["USD_EGP"] = asof_values(hist.index.values.astype("M8[D]"), fx["date"], fx["close"])
+        else:
+            hist["USD_EGP"] = self.usd_rates()[0]["EGP"]
+        return hist
+
+    # USD/EGP daily history (brought up to date at most once per "history" TTL), or None
+    def _fx_history(self):
+        try:
+            market_cache.get("history", "EGP=X", self.fx_store.sync)
+            fx = self.fx_store.records()
+        except Exception:
+            return None
+        return fx if len(fx) else None
+
+    # FX inputs of the bars before `date`: the FX rows dated before it, or
+    # today's rate when there is no FX history
+    def _fx_before(self, fx, date):
+        if fx is None:
+            return ("today", self.usd_rates()[0]["EGP"])
+        rows = fx[fx["date"] < np.datetime64(date, "D")]
+        return (rows["date"].tobytes(), rows["close"].tobytes())
+
+    # Indicator engine over the 21K EGP/gram history, fed only the bars it has
+    # not seen yet. Its committed bars were converted with the FX rows of the
+    # time, so it starts over only when those rows change (a correction, or FX
+    # history arriving after a first run on today's rate); appended FX days
+    # keep it incremental.
+    @metrics.timed("core.indicators")
+    def indicators(self):
+        with self._indicator_lock:
+            engine = self.indicator_engine
+            fx = self._fx_history()
+            if engine.last_date is not None and self._fx_before(fx, engine.last_date) != self._indicator_fx:
+                engine.reset()
+            hist = self._with_fx(self.gold_history(start=engine.last_date), fx)
+            fx_rates = {"EGP": hist["USD_EGP"]}
+            engine.sync(pd.DataFrame({column: price_matrix(hist[column], fx_rates).get("21K", "gram", "EGP") for column in ("High", "Low", "Close")}))
+            if engine.last_date is not None:
+                self._indicator_fx = self._fx_before(fx, engine.last_date)
+        return self.indicator_engine
+
+    # 21K EGP/gram history for a period
+    def price_history_egp(self, period=None, start=None):
+        hist = self.gold_history_egp(period, start)
+        return price_matrix(hist["Close"], {"EGP": hist["USD_EGP"]}).get("21K", "gram", "EGP")
+
+    # EGP/gram history per karat for a period (one column per karat)
+    def karat_history_egp(self, period=None, start=None):
+        hist = self.gold_history_egp(period, start)
+        prices = price_matrix(hist["Close"], {"EGP": hist["USD_EGP"]}, units=["gram"], currencies=["EGP"])
+        return pd.DataFrame({k: prices.get(k) for k in prices.karats})
+
+    # Month-start 21K EGP/gram prices over the stored history (savings-plan backtests)
+    @metrics.timed("core.monthly_prices_egp")
+    def monthly_prices_egp(self):
+        monthly = month_start(self.gold_history_egp())
+        return price_matrix(monthly["Close"], {"EGP": monthly["USD_EGP"]}).get("21K", "gram", "EGP").to_numpy()
+
+    # Last day's 21K EGP/gram change as (change, percent), or None without two days of data
+    def price_change(self):
+        prices = self.price_history_egp("5d").iloc[-2:]
+        if len(prices) < 2:
+            return None
+        yesterday, today = prices
+        return today - yesterday, (today - yesterday) / yesterday * 100
+
+    # Portfolios and alerts
+
+    # Portfolio ledger (buy/sell lots) in data_dir/portfolio.db
+    @property
+    def ledger(self):
+        with self._lock:
+            if self._ledger is None:
+                self._ledger = Ledger(os.path.join(self.data_dir, "portfolio.db"))
+            return self._ledger
+
+    # Value and P/L of portfolios at prices (karat -> EGP/gram; the current quote by default)
+    @metrics.timed("core.portfolio_value")
+    def portfolio_value(self, portfolio_ids=None, method="fifo", prices=None):
+        if prices is None:
+            prices = self.karat_prices_egp()
+        return self.ledger.revalue(prices, method, portfolio_ids)
+
+    # Alert engine checking the quote every ALERT_POLL_INTERVAL seconds
+    @property
+    def alert_engine(self):
+        with self._lock:
+            if self._alert_engine is None:
+                self._alert_engine = AlertEngine(MemorySink())
+                self._alert_engine.start(self.karat_prices_egp, interval=ALERT_POLL_INTERVAL)
+            return self._alert_engine
+
+    # News poller filling data_dir/news.db in the background
+    @property
+    def news_poller(self):
+        with self._lock:
+            if self._news_poller is None:
+                self._news_poller = NewsPoller(NewsStore(os.path.join(self.data_dir, "news.db")),
+                                               self.config.get("NEWS_API_KEY"), session=providers.session)
+                self._news_poller.start()
+            return self._news_poller
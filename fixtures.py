@@ -0,0 +1,206 @@
+# Record/replay of upstream responses, for offline runs and benchmarks
+#
+#   GOLD_FIXTURES=record streamlit run test.py   # call the real APIs and save every response
+#   GOLD_FIXTURES=replay streamlit run test.py   # serve the saved responses, no network
+#
+# HTTP APIs on the shared provider session (Alpha Vantage, ExchangeRate-API,
+# NewsAPI) are captured by a requests transport adapter as JSON files.
+# yfinance and the language model use their own clients, so they are
+# captured at the call level. API keys are stripped from URLs before they
+# are saved or used as keys. A replayed call without an exact recording gets
+# the latest recording of the same endpoint (URLs and arguments with dates,
+# such as NewsAPI's `from`, change on every run).
+import hashlib
+import json
+import os
+import pickle
+import threading
+from http.client import responses as REASONS
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from providers import providers
+
+RECORD = "record"
+REPLAY = "replay"
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fixtures")
+
+# Providers whose clients do not go through the shared requests session
+CALL_PROVIDERS = ("yahoo", "yahoo_history")
+SECRET_PARAMS = {"apikey", "api_key", "token", "access_token"}
+
+
+class FixtureMissing(LookupError):
+    pass
+
+
+class Fixtures:
+    def __init__(self, directory=DEFAULT_DIR, mode=REPLAY, secrets=()):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"unknown fixture mode: {mode}")
+        self.directory = directory
+        self.mode = mode
+        self.secrets = [secret for secret in secrets if secret and len(secret) >= 4]
+        self._lock = threading.Lock()
+        self._latest = {}
+        for kind in ("http", "calls"):
+            os.makedirs(os.path.join(directory, kind), exist_ok=True)
+        # Latest recording per endpoint, for replays without an exact match
+        for path in sorted(self._paths(), key=os.path.getmtime):
+            self._remember(self._endpoint_of(path), path)
+
+    # Fixtures from GOLD_FIXTURES (record/replay) and GOLD_FIXTURES_DIR, or None
+    @classmethod
+    def from_env(cls, secrets=()):
+        mode = os.environ.get("GOLD_FIXTURES")
+        if not mode:
+            return None
+        return cls(os.environ.get("GOLD_FIXTURES_DIR", DEFAULT_DIR), mode, secrets)
+
+    # Route the shared session and the non-HTTP providers through the fixtures.
+    # Call after the providers are registered (i.e. after creating GoldCore).
+    def install(self, session=None):
+        session = session or providers.session
+        adapter = FixtureAdapter(self)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        for name in CALL_PROVIDERS:
+            providers.wrap(name, lambda fetch, name=name: self.wrap(name, fetch))
+
+    # A language model whose invoke() is recorded or replayed (llm is unused when replaying)
+    def llm(self, llm=None):
+        return FixtureLLM(self, llm)
+
+    # fn(*args), recorded under `name` or replayed from the fixtures
+    def wrap(self, name, fn):
+        def wrapper(*args):
+            if self.mode == REPLAY:
+                return self.replay_call(name, args)
+            value = fn(*args)
+            self.add_call(name, args, value)
+            return value
+        return wrapper
+
+    def add_call(self, name, args, value):
+        path = os.path.join(self.directory, "calls", f"{name}__{self._hash(repr(args))}.pkl")
+        self._save(path, pickle.dumps({"name": name, "args": args, "value": value}), (name, self._first(args)))
+
+    def replay_call(self, name, args):
+        path = os.path.join(self.directory, "calls", f"{name}__{self._hash(repr(args))}.pkl")
+        if not os.path.exists(path):
+            path = self._latest.get((name, self._first(args))) or self._latest.get((name, None))
+        if path is None:
+            raise FixtureMissing(f"no recording for {name}{args}")
+        with open(path, "rb") as f:
+            return pickle.load(f)["value"]
+
+    def add_http(self, method, url, body, status=200, headers=None):
+        url = self.redact(url)
+        path = self._http_path(method, url)
+        record = {"method": method, "url": url, "status": status, "headers": dict(headers or {}), "body": body}
+        self._save(path, json.dumps(record, ensure_ascii=False, indent=1).encode("utf-8"), self._endpoint(method, url))
+
+    def replay_http(self, request):
+        url = self.redact(request.url)
+        path = self._http_path(request.method, url)
+        if not os.path.exists(path):
+            path = self._latest.get(self._endpoint(request.method, url))
+        if path is None:
+            raise FixtureMissing(f"no recording for {request.method} {url}")
+        with open(path, encoding="utf-8") as f:
+            record = json.load(f)
+        response = requests.Response()
+        response.status_code = record["status"]
+        response.reason = REASONS.get(record["status"], "")
+        response.headers = CaseInsensitiveDict(record["headers"])
+        response._content = record["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    # URL with secret query parameters dropped and secret values masked
+    def redact(self, url):
+        parts = urlsplit(url)
+        query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS])
+        url = urlunsplit(parts._replace(query=query))
+        for secret in self.secrets:
+            url = url.replace(secret, "REDACTED")
+        return url
+
+    def _http_path(self, method, url):
+        return os.path.join(self.directory, "http", f"{urlsplit(url).hostname}__{self._hash(method + ' ' + url)}.json")
+
+    @staticmethod
+    def _endpoint(method, url):
+        parts = urlsplit(url)
+        return (method, parts.hostname, parts.path)
+
+    @staticmethod
+    def _first(args):
+        return args[0] if args else None
+
+    @staticmethod
+    def _hash(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+    def _paths(self):
+        for kind in ("http", "calls"):
+            folder = os.path.join(self.directory, kind)
+            for filename in os.listdir(folder):
+                if filename.endswith((".json", ".pkl")):
+                    yield os.path.join(folder, filename)
+
+    def _endpoint_of(self, path):
+        if path.endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+            return self._endpoint(record["method"], record["url"])
+        with open(path, "rb") as f:
+            record = pickle.load(f)
+        return (record["name"], self._first(record["args"]))
+
+    def _save(self, path, data, endpoint):
+        with self._lock:
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._remember(endpoint, path)
+
+    # Calls are also remembered by name alone: (name, first argument) and (name, None)
+    def _remember(self, endpoint, path):
+        self._latest[endpoint] = path
+        if len(endpoint) == 2:
+            self._latest[(endpoint[0], None)] = path
+
+
+class FixtureAdapter(HTTPAdapter):
+    def __init__(self, fixtures, pool_connections=20, pool_maxsize=20):
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.fixtures = fixtures
+
+    def send(self, request, **kwargs):
+        if self.fixtures.mode == REPLAY:
+            return self.fixtures.replay_http(request)
+        response = super().send(request, **kwargs)
+        self.fixtures.add_http(request.method, request.url, response.content.decode("utf-8", errors="replace"),
+                               response.status_code, response.headers)
+        return response
+
+
+class FixtureLLM:
+    def __init__(self, fixtures, llm=None):
+        self.fixtures = fixtures
+        self._invoke = fixtures.wrap("huggingface", self._call)
+        self.llm = llm
+
+    def invoke(self, prompt):
+        return self._invoke(prompt)
+
+    def _call(self, prompt):
+        return self.llm.invoke(prompt)
+
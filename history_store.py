@@ -0,0 +1,145 @@
+# Local columnar store for daily price history (one memory-mapped .npy file per symbol)
+#
+# The first sync backfills BACKFILL_PERIOD of bars; later syncs only fetch from
+# the last stored day onwards (that day is re-fetched because its bar may
+# still be moving). Reads slice the memory-mapped array by date and never
+# touch the network.
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+HISTORY_DTYPE = np.dtype([
+    ("date", "M8[D]"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+])
+BACKFILL_PERIOD = "5y"
+
+# yfinance-style periods understood by HistoryStore.frame
+PERIOD_OFFSETS = {
+    "5d": pd.DateOffset(days=5),
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+}
+
+
+# Convert an OHLC DataFrame (yfinance layout, or a CSV with a Date column) to rows
+def to_records(frame):
+    if "Date" in frame.columns:
+        frame = frame.set_index("Date")
+    index = pd.DatetimeIndex(pd.to_datetime(frame.index, utc=False))
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    records = np.empty(len(frame), dtype=HISTORY_DTYPE)
+    records["date"] = index.normalize().values.astype("M8[D]")
+    for column in ("open", "high", "low", "close"):
+        records[column] = frame[column.capitalize()].to_numpy(dtype="f8")
+    # Keep the last bar for each day, sorted by date
+    records = records[np.argsort(records["date"], kind="stable")]
+    keep = np.ones(len(records), dtype=bool)
+    keep[:-1] = records["date"][1:] != records["date"][:-1]
+    return records[keep]
+
+
+# As-of join: the last known reference value on or before each date
+# (forward-filled over weekends and holidays; dates before the first
+# reference point take the first value). All inputs are sorted datetime64[D].
+def asof_values(dates, ref_dates, ref_values):
+    positions = np.searchsorted(ref_dates, dates, side="right") - 1
+    return np.asarray(ref_values)[np.clip(positions, 0, None)]
+
+
+class HistoryStore:
+    # fetch(start) returns daily bars from `start` (an ISO date string), or the
+    # full backfill when start is None. seed_path is an optional CSV used to
+    # populate an empty store before the first fetch (offline fixtures).
+    def __init__(self, path, fetch, seed_path=None):
+        self.path = path
+        self.fetch = fetch
+        self.seed_path = seed_path
+        self.last_error = None
+        self._lock = threading.RLock()
+        self._data = None
+        self._mtime = None
+
+    def __len__(self):
+        return len(self._load())
+
+    # Memory-mapped rows, reopened when the file changes on disk
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            if self.seed_path and os.path.exists(self.seed_path):
+                with self._lock:
+                    if not os.path.exists(self.path):
+                        self._write(to_records(pd.read_csv(self.seed_path)))
+                return self._load()
+            return np.empty(0, dtype=HISTORY_DTYPE)
+        if self._data is None or mtime != self._mtime:
+            self._data = np.load(self.path, mmap_mode="r")
+            self._mtime = mtime
+        return self._data
+
+    def _write(self, records):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # One temp file per process: several service workers may sync the same store
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, records)
+        # Release the mapping first; Windows cannot replace a mapped file
+        self._data = None
+        os.replace(tmp_path, self.path)
+
+    # Fetch missing days and append them; returns the number of rows added.
+    # Upstream failures are kept in last_error unless the store is empty.
+    def sync(self):
+        with self._lock:
+            data = np.array(self._load())
+            start = str(data["date"][-1]) if len(data) else None
+            try:
+                fetched = to_records(self.fetch(start))
+            except Exception as e:
+                if not len(data):
+                    raise
+                self.last_error = e
+                return 0
+            self.last_error = None
+            if not len(fetched):
+                return 0
+            kept = data[data["date"] < fetched["date"][0]]
+            self._write(np.concatenate([kept, fetched]))
+            return len(kept) + len(fetched) - len(data)
+
+    # Rows covering `period` ("1mo", "1y", ...) up to the last stored day,
+    # or every row from `start` (a date) onwards
+    def records(self, period=None, start=None):
+        data = self._load()
+        if not len(data):
+            return np.array(data)
+        if period is not None:
+            last_day = pd.Timestamp(data["date"][-1])
+            start = (last_day - PERIOD_OFFSETS[period]).date()
+        if start is None:
+            return np.array(data)
+        first = np.searchsorted(data["date"], np.datetime64(start, "D"), side="left")
+        return np.array(data[first:])
+
+    # Same rows as a yfinance-style DataFrame (Open/High/Low/Close, Date index)
+    def frame(self, period=None, start=None):
+        records = self.records(period, start)
+        return pd.DataFrame(
+            {column.capitalize(): records[column] for column in ("open", "high", "low", "close")},
+            index=pd.DatetimeIndex(records["date"].astype("M8[ns]"), name="Date"),
+        )
+
+    def tail(self, n):
+        return np.array(self._load()[-n:])
@@ -0,0 +1,176 @@
+# Incremental technical indicators over daily bars
+#
+# IndicatorEngine keeps rolling state (running sums, EMA/Wilder averages) so
+# each new bar costs O(1). The most recent bar is provisional: another bar for
+# the same day replaces it (intraday updates), and it is only folded into the
+# rolling state once a later day arrives.
+import math
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+NAN = float("nan")
+
+
+# Running sum and sum of squares over the last `size` values
+class _Window:
+    def __init__(self, size):
+        self.size = size
+        self.values = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    # (mean, sample stddev) of the window with x appended; NaN until it is full
+    def peek(self, x):
+        total, total_sq, n = self.total + x, self.total_sq + x * x, len(self.values) + 1
+        if n > self.size:
+            old = self.values[0]
+            total, total_sq, n = total - old, total_sq - old * old, n - 1
+        if n < self.size:
+            return NAN, NAN
+        mean = total / n
+        variance = max(total_sq - n * mean * mean, 0.0) / (n - 1) if n > 1 else 0.0
+        return mean, math.sqrt(variance)
+
+    def push(self, x):
+        self.values.append(x)
+        self.total += x
+        self.total_sq += x * x
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+
+
+# Exponential average seeded with the simple mean of the first `warmup` values
+# (alpha = 2 / (span + 1) for an EMA, 1 / period for Wilder smoothing)
+class _Smoothed:
+    def __init__(self, alpha, warmup):
+        self.alpha = alpha
+        self.warmup = warmup
+        self.count = 0
+        self.seed_total = 0.0
+        self.value = NAN
+
+    def peek(self, x):
+        if self.count + 1 < self.warmup:
+            return NAN
+        if self.count + 1 == self.warmup:
+            return (self.seed_total + x) / self.warmup
+        return self.value + self.alpha * (x - self.value)
+
+    def push(self, x):
+        self.value = self.peek(x)
+        self.count += 1
+        if self.count < self.warmup:
+            self.seed_total += x
+
+
+class IndicatorEngine:
+    def __init__(self, sma_windows=(50, 200), ema_spans=(20,), volatility_window=20,
+                 atr_period=14, rsi_period=14, bollinger_window=20, bollinger_k=2.0):
+        self.sma_windows = tuple(sma_windows)
+        self.ema_spans = tuple(ema_spans)
+        self.volatility_window = volatility_window
+        self.atr_period = atr_period
+        self.rsi_period = rsi_period
+        self.bollinger_window = bollinger_window
+        self.bollinger_k = bollinger_k
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        self._sma = {w: _Window(w) for w in self.sma_windows}
+        self._ema = {s: _Smoothed(2 / (s + 1), s) for s in self.ema_spans}
+        self._returns = _Window(self.volatility_window)
+        self._bollinger = _Window(self.bollinger_window)
+        self._atr = _Smoothed(1 / self.atr_period, self.atr_period)
+        self._gains = _Smoothed(1 / self.rsi_period, self.rsi_period)
+        self._losses = _Smoothed(1 / self.rsi_period, self.rsi_period)
+        self._prev_close = None
+        self._pending = None
+        self._latest = None
+        self._dates = []
+        self._rows = []
+
+    @property
+    def columns(self):
+        return (["close", "change_pct"] + [f"sma{w}" for w in self.sma_windows] + [f"ema{s}" for s in self.ema_spans]
+                + ["volatility", "atr", "rsi", "bb_mid", "bb_upper", "bb_lower"])
+
+    @property
+    def last_date(self):
+        return self._pending[0] if self._pending else None
+
+    # Add a daily bar (or replace the provisional bar for the same day)
+    def update(self, date, high, low, close):
+        with self._lock:
+            if self._pending is not None:
+                if date < self._pending[0]:
+                    raise ValueError(f"bar for {date} is older than {self._pending[0]}")
+                if date > self._pending[0]:
+                    self._rows.append(self._step(*self._pending[1:], commit=True))
+                    self._dates.append(self._pending[0])
+            self._pending = (date, high, low, close)
+            self._latest = self._step(high, low, close, commit=False)
+            return dict(zip(self.columns, self._latest))
+
+    # Feed the bars of a DataFrame (Date index, High/Low/Close) that are not
+    # older than the last bar seen; returns the number of bars processed
+    def sync(self, frame):
+        with self._lock:
+            if self.last_date is not None:
+                frame = frame[frame.index >= self.last_date]
+            for date, high, low, close in zip(frame.index, frame["High"], frame["Low"], frame["Close"]):
+                self.update(date, float(high), float(low), float(close))
+            return len(frame)
+
+    # Indicator values for the latest bar, as numbers
+    def latest(self):
+        with self._lock:
+            return dict(zip(self.columns, self._latest)) if self._latest else {}
+
+    # All bars and indicator values as a DataFrame indexed by date
+    def frame(self):
+        with self._lock:
+            rows = self._rows + ([self._latest] if self._latest else [])
+            dates = self._dates + ([self._pending[0]] if self._pending else [])
+        return pd.DataFrame(np.array(rows, dtype="f8").reshape(len(rows), len(self.columns)),
+                            index=pd.DatetimeIndex(dates, name="Date"), columns=self.columns)
+
+    # Indicator values for a bar on top of the committed state, folding it in when commit is set
+    def _step(self, high, low, close, commit):
+        prev = self._prev_close
+        row = [close, (close / prev - 1) * 100 if prev else NAN]
+        for window in self._sma.values():
+            row.append(window.peek(close)[0])
+        for ema in self._ema.values():
+            row.append(ema.peek(close))
+        log_return = math.log(close / prev) if prev else None
+        row.append(self._returns.peek(log_return)[1] if log_return is not None else NAN)
+        true_range = max(high - low, abs(high - prev), abs(low - prev)) if prev else high - low
+        row.append(self._atr.peek(true_range))
+        if prev:
+            gain, loss = max(close - prev, 0.0), max(prev - close, 0.0)
+            avg_gain, avg_loss = self._gains.peek(gain), self._losses.peek(loss)
+            row.append(100.0 if avg_loss == 0 else 100 - 100 / (1 + avg_gain / avg_loss))
+        else:
+            row.append(NAN)
+        mid, std = self._bollinger.peek(close)
+        row += [mid, mid + self.bollinger_k * std, mid - self.bollinger_k * std]
+        if commit:
+            for window in self._sma.values():
+                window.push(close)
+            for ema in self._ema.values():
+                ema.push(close)
+            if log_return is not None:
+                self._returns.push(log_return)
+            self._atr.push(true_range)
+            if prev:
+                self._gains.push(gain)
+                self._losses.push(loss)
+            self._bollinger.push(close)
+            self._prev_close = close
+        return row
@@ -0,0 +1,261 @@
+# Portfolio ledger: buy/sell lots per portfolio in a local SQLite file
+#
+# Lots are read column-wise (one DataFrame column per field) and every
+# calculation below is an array pass over all portfolios at once: holdings,
+# FIFO or average-cost P/L and value histories never build per-lot objects.
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BUY = 1
+SELL = -1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS portfolios (
+    id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    UNIQUE (owner, name)
+);
+CREATE TABLE IF NOT EXISTS lots (
+    id INTEGER PRIMARY KEY,
+    portfolio_id INTEGER NOT NULL REFERENCES portfolios (id) ON DELETE CASCADE,
+    ts TEXT NOT NULL,
+    side INTEGER NOT NULL,
+    karat TEXT NOT NULL,
+    grams REAL NOT NULL CHECK (grams > 0),
+    price REAL NOT NULL CHECK (price >= 0)
+);
+CREATE INDEX IF NOT EXISTS lots_by_group ON lots (portfolio_id, karat, ts, id);
+"""
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOT_COLUMNS = "id, portfolio_id, ts, side, karat, grams, price"
+LOT_ORDER = "ORDER BY portfolio_id, karat, ts, id"
+# Lowest running holding of each (portfolio, karat) group, in lot order
+MIN_HOLDING = """
+SELECT portfolio_id, karat, MIN(held) FROM (
+    SELECT portfolio_id, karat, SUM(side * grams) OVER (PARTITION BY portfolio_id, karat ORDER BY ts, id) AS held
+    FROM lots WHERE portfolio_id IN ({})
+) GROUP BY portfolio_id, karat
+"""
+
+
+class Ledger:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._writes = 0
+        self._all_lots = None
+
+    def close(self):
+        self._conn.close()
+
+    # Id of the owner's portfolio with this name, created if needed
+    def create_portfolio(self, owner, name):
+        with self._lock, self._conn:
+            self._writes += 1
+            self._conn.execute(
+                "INSERT OR IGNORE INTO portfolios (owner, name, created_at) VALUES (?, ?, ?)",
+                (owner, name, datetime.now().isoformat(timespec="seconds")),
+            )
+            return self._conn.execute("SELECT id FROM portfolios WHERE owner = ? AND name = ?", (owner, name)).fetchone()[0]
+
+    def portfolios(self, owner=None):
+        query = "SELECT id, owner, name, created_at FROM portfolios"
+        params = ()
+        if owner is not None:
+            query += " WHERE owner = ?"
+            params = (owner,)
+        return self._read(query + " ORDER BY id", params)
+
+    def delete_portfolio(self, portfolio_id):
+        with self._lock, self._conn:
+            self._writes += 1
+            self._conn.execute("DELETE FROM portfolios WHERE id = ?", (portfolio_id,))
+
+    # Record a buy or sell lot. A lot that leaves the portfolio selling more
+    # than it holds at any point (also after a back-dated sell) raises ValueError.
+    def add_lot(self, portfolio_id, side, grams, price, karat="21K", ts=None):
+        if side not in (BUY, SELL):
+            raise ValueError("side must be BUY or SELL")
+        if grams <= 0 or price < 0:
+            raise ValueError("grams must be positive and price non-negative")
+        ts = (ts or datetime.now()).strftime(TS_FORMAT)
+        with self._lock, self._conn:
+            self._writes += 1
+            cursor = self._conn.execute(
+                "INSERT INTO lots (portfolio_id, ts, side, karat, grams, price) VALUES (?, ?, ?, ?, ?, ?)",
+                (portfolio_id, ts, side, karat, grams, price),
+            )
+            self._check_holdings([portfolio_id])
+            return cursor.lastrowid
+
+    # Bulk insert from a DataFrame with portfolio_id, ts, side, karat, grams, price
+    # columns; nothing is inserted if any portfolio would end up oversold
+    def import_lots(self, lots):
+        lots = lots.assign(ts=pd.to_datetime(lots["ts"]).dt.strftime(TS_FORMAT))
+        rows = lots[["portfolio_id", "ts", "side", "karat", "grams", "price"]].itertuples(index=False, name=None)
+        with self._lock, self._conn:
+            self._writes += 1
+            self._conn.executemany("INSERT INTO lots (portfolio_id, ts, side, karat, grams, price) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._check_holdings(lots["portfolio_id"].unique().tolist())
+
+    # Delete a lot; deleting a buy that later sells depend on raises ValueError
+    def delete_lot(self, lot_id):
+        with self._lock, self._conn:
+            self._writes += 1
+            row = self._conn.execute("SELECT portfolio_id FROM lots WHERE id = ?", (lot_id,)).fetchone()
+            self._conn.execute("DELETE FROM lots WHERE id = ?", (lot_id,))
+            if row is not None:
+                self._check_holdings([row[0]])
+
+    # Raise ValueError (rolling back the open transaction) if a group of these
+    # portfolios sells more than it holds at any point in time
+    def _check_holdings(self, portfolio_ids):
+        portfolio_ids = [int(i) for i in portfolio_ids]
+        query = MIN_HOLDING.format(",".join("?" * len(portfolio_ids)))
+        for portfolio_id, karat, held in self._conn.execute(query, portfolio_ids):
+            if held < -1e-9:
+                raise ValueError(f"portfolio {portfolio_id} would sell {-held:.3f} g of {karat} more than it holds")
+
+    # Lots as columns, ordered by portfolio, karat and time. The full table
+    # is kept in memory until this or another connection writes to the file.
+    def lots(self, portfolio_ids=None):
+        if portfolio_ids is not None:
+            portfolio_ids = list(portfolio_ids)
+            return self._read_lots(f"WHERE portfolio_id IN ({','.join('?' * len(portfolio_ids))})", tuple(portfolio_ids))
+        with self._lock:
+            version = (self._conn.execute("PRAGMA data_version").fetchone()[0], self._writes)
+            cached = self._all_lots
+        if cached is None or cached[0] != version:
+            cached = self._all_lots = (version, self._read_lots())
+        return cached[1].copy()
+
+    def _read_lots(self, where="", params=()):
+        lots = self._read(f"SELECT {LOT_COLUMNS} FROM lots {where} {LOT_ORDER}", params)
+        lots["ts"] = pd.to_datetime(lots["ts"], format=TS_FORMAT)
+        return lots
+
+    # Net grams per portfolio and karat, aggregated in SQLite
+    def holdings(self, portfolio_ids=None):
+        query = "SELECT portfolio_id, karat, SUM(side * grams) AS grams FROM lots"
+        params = ()
+        if portfolio_ids is not None:
+            portfolio_ids = list(portfolio_ids)
+            query += f" WHERE portfolio_id IN ({','.join('?' * len(portfolio_ids))})"
+            params = tuple(portfolio_ids)
+        return self._read(query + " GROUP BY portfolio_id, karat", params)
+
+    # Reprice portfolios against `prices` (karat -> price per gram). method is
+    # "fifo" or "average" (running weighted average cost: each sale is costed at
+    # the average of what was held when it was made). Returns one
+    # row per portfolio: grams, cost basis, value, realized and unrealized P/L.
+    def revalue(self, prices, method="fifo", portfolio_ids=None):
+        return revalue_lots(self.lots(portfolio_ids), prices, method)
+
+    # Value of each portfolio on each date; prices maps karat -> price per
+    # gram aligned with `dates`. Returns a dates x portfolios DataFrame.
+    def value_history(self, dates, prices, portfolio_ids=None):
+        return value_history(self.lots(portfolio_ids), dates, prices)
+
+    def _read(self, query, params=()):
+        with self._lock:
+            return pd.read_sql_query(query, self._conn, params=params)
+
+
+# Reprice a lots frame (see Ledger.lots) in one columnar pass
+def revalue_lots(lots, prices, method="fifo"):
+    columns = ["portfolio_id", "grams", "cost_basis", "value", "realized_pl", "unrealized_pl"]
+    if lots.empty:
+        return pd.DataFrame(columns=columns).set_index("portfolio_id")
+    is_buy = lots["side"].to_numpy() == BUY
+    grams = lots["grams"].to_numpy(dtype="f8")
+    amount = grams * lots["price"].to_numpy(dtype="f8")
+    groups = lots.groupby(["portfolio_id", "karat"], sort=False).ngroup().to_numpy()
+    n_groups = groups.max() + 1
+    bought = np.bincount(groups, np.where(is_buy, grams, 0.0), n_groups)
+    cost = np.bincount(groups, np.where(is_buy, amount, 0.0), n_groups)
+    # Sales beyond a group's purchases (not accepted by the ledger) are not costed
+    sold = np.minimum(np.bincount(groups, np.where(is_buy, 0.0, grams), n_groups), bought)
+    proceeds = np.bincount(groups, np.where(is_buy, 0.0, amount), n_groups)
+
+    if method == "fifo":
+        # Sold grams always come from the earliest purchases, so the cost of
+        # what was sold is the cost of the first `sold` grams bought. Chain
+        # every group's buys into one increasing cumulative-grams curve and
+        # read that cost off with a single np.interp call, clipped to the
+        # group's own stretch of the curve.
+        buy_groups = groups[is_buy]
+        cum_grams = np.concatenate([[0.0], np.cumsum(grams[is_buy])])
+        cum_cost = np.concatenate([[0.0], np.cumsum(amount[is_buy])])
+        first_buy = np.searchsorted(buy_groups, np.arange(n_groups), side="left")
+        last_buy = np.searchsorted(buy_groups, np.arange(n_groups), side="right")
+        sold_to = np.minimum(cum_grams[first_buy] + sold, cum_grams[last_buy])
+        sold_cost = np.interp(sold_to, cum_grams, cum_cost) - cum_cost[first_buy]
+    elif method == "average":
+        sold_cost = cost - _average_cost_held(groups, is_buy, grams, amount)
+    else:
+        raise ValueError(f"unknown method: {method}")
+
+    keys = lots[["portfolio_id", "karat"]].drop_duplicates()
+    held = bought - sold
+    price = keys["karat"].map(prices).to_numpy(dtype="f8")
+    cost_basis = cost - sold_cost
+    value = held * price
+    per_group = pd.DataFrame({
+        "portfolio_id": keys["portfolio_id"].to_numpy(),
+        "grams": held,
+        "cost_basis": cost_basis,
+        "value": value,
+        "realized_pl": proceeds - sold_cost,
+        "unrealized_pl": value - cost_basis,
+    })
+    return per_group.groupby("portfolio_id").sum()
+
+
+# Cost still held per group at its running weighted-average cost, for lots
+# sorted by group and time. A sale removes its share (grams after / grams
+# before) of the cost held, so the cost held after each lot is
+# P * cumsum(buy amount / P), with P the product of those shares so far.
+# Runs restart once a group's holdings reach zero, which keeps P above 0.
+def _average_cost_held(groups, is_buy, grams, amount):
+    signed = np.where(is_buy, grams, -grams)
+    held_after = pd.Series(signed).groupby(groups).cumsum().to_numpy()
+    held_before = held_after - signed
+    share = np.divide(held_after, held_before, out=np.zeros(len(grams)), where=held_before > 1e-9)
+    share = np.where(is_buy, 1.0, np.clip(share, 0.0, 1.0))
+    new_group = np.concatenate([[True], groups[1:] != groups[:-1]])
+    emptied = np.concatenate([[False], held_after[:-1] <= 1e-9])
+    runs = np.cumsum(new_group | emptied)
+    kept = pd.Series(share).groupby(runs).cumprod().to_numpy()
+    scaled = np.divide(amount, kept, out=np.zeros(len(grams)), where=is_buy)
+    cost_held = kept * pd.Series(scaled).groupby(runs).cumsum().to_numpy()
+    last = np.concatenate([groups[1:] != groups[:-1], [True]])
+    return cost_held[last]
+
+
+# Portfolio values on each date from a lots frame (see Ledger.value_history)
+def value_history(lots, dates, prices):
+    dates = pd.DatetimeIndex(dates)
+    if lots.empty:
+        return pd.DataFrame(index=dates)
+    karats = list(prices)
+    karat_codes = lots["karat"].map({k: i for i, k in enumerate(karats)}).to_numpy()
+    portfolio_ids, portfolio_codes = np.unique(lots["portfolio_id"].to_numpy(), return_inverse=True)
+    # Each lot counts from the first date on or after its timestamp's day
+    first_date = np.searchsorted(dates.values, lots["ts"].dt.normalize().values, side="left")
+    signed = lots["side"].to_numpy() * lots["grams"].to_numpy(dtype="f8")
+    held = np.zeros((len(portfolio_ids), len(karats), len(dates) + 1))
+    np.add.at(held, (portfolio_codes, karat_codes, first_date), signed)
+    held = np.cumsum(held, axis=2)[:, :, :-1]
+    price_grid = np.stack([np.asarray(prices[k], dtype="f8") for k in karats])
+    return pd.DataFrame((held * price_grid[None, :, :]).sum(axis=1).T, index=dates, columns=portfolio_ids)
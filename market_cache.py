@@ -0,0 +1,154 @@
+# Shared in-process cache for market data (quotes, FX rates, history)
+#
+# One instance is shared by every Streamlit session in the process. Each
+# data source has its own TTL; concurrent misses for the same key share a
+# single upstream call (single-flight), and expired entries keep being served
+# while one background thread refreshes them (stale-while-revalidate).
+import threading
+import time
+from collections import OrderedDict
+
+# Freshness per data source, in seconds
+DEFAULT_TTLS = {
+    "quote": 300,      # 5 minutes, as before
+    "fx": 3600,
+    "history": 3600,
+}
+
+# How long past its TTL an entry may still be served while it is refreshed
+DEFAULT_STALE_FOR = {
+    "quote": 3600,
+    "fx": 24 * 3600,
+    "history": 7 * 24 * 3600,
+}
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_ENTRIES = 256
+
+
+class _Entry:
+    __slots__ = ("value", "stored_at")
+
+    def __init__(self, value, stored_at):
+        self.value = value
+        self.stored_at = stored_at
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class MarketCache:
+    def __init__(self, ttls=None, stale_for=None, max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.stale_for = dict(DEFAULT_STALE_FOR if stale_for is None else stale_for)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._stats = {}
+
+    # Return the cached value for (source, key), calling loader() when needed
+    def get(self, source, key, loader):
+        cache_key = (source, key)
+        ttl = self.ttls.get(source, DEFAULT_TTL)
+        stale_for = self.stale_for.get(source, 0)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                age = self._clock() - entry.stored_at
+                if age < ttl:
+                    self._entries.move_to_end(cache_key)
+                    self._count(source, "hits")
+                    return entry.value
+                if age < ttl + stale_for:
+                    self._entries.move_to_end(cache_key)
+                    self._count(source, "stale_hits")
+                    if cache_key not in self._flights:
+                        flight = self._flights[cache_key] = _Flight()
+                        threading.Thread(
+                            target=self._run, args=(cache_key, loader, flight),
+                            name=f"cache-refresh-{source}", daemon=True,
+                        ).start()
+                    return entry.value
+            self._count(source, "misses")
+            flight = self._flights.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cache_key] = _Flight()
+        if leader:
+            self._run(cache_key, loader, flight)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    # Return the cached value without loading; expired entries are ignored
+    def peek(self, source, key, default=None):
+        with self._lock:
+            entry = self._entries.get((source, key))
+            if entry is None:
+                return default
+            if self._clock() - entry.stored_at >= self.ttls.get(source, DEFAULT_TTL) + self.stale_for.get(source, 0):
+                return default
+            return entry.value
+
+    def set(self, source, key, value):
+        with self._lock:
+            self._store((source, key), value)
+
+    def invalidate(self, source=None, key=None):
+        with self._lock:
+            for cache_key in list(self._entries):
+                if (source is None or cache_key[0] == source) and (key is None or cache_key[1] == key):
+                    del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+    # Hit/miss counters per data source, plus the current size
+    def stats(self):
+        with self._lock:
+            stats = {source: dict(counts) for source, counts in self._stats.items()}
+            stats["_size"] = len(self._entries)
+            return stats
+
+    def _run(self, cache_key, loader, flight):
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+        with self._lock:
+            if flight.error is None:
+                self._store(cache_key, flight.value)
+                self._count(cache_key[0], "loads")
+            else:
+                self._count(cache_key[0], "errors")
+            self._flights.pop(cache_key, None)
+        flight.done.set()
+
+    # Caller must hold the lock
+    def _store(self, cache_key, value):
+        self._entries[cache_key] = _Entry(value, self._clock())
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._count(evicted[0], "evictions")
+
+    # Caller must hold the lock
+    def _count(self, source, name):
+        counts = self._stats.setdefault(source, {})
+        counts[name] = counts.get(name, 0) + 1
+
+
+# Process-wide cache shared by all sessions
+market_cache = MarketCache()
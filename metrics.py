@@ -0,0 +1,138 @@
+# Timing spans and latency metrics for upstream calls and compute blocks
+#
+#   with metrics.span("upstream.yahoo"):
+#       ...
+#
+# Every span adds its duration to a process-wide summary per name (count,
+# errors, p50/p95/max over the last MAX_SAMPLES calls). Spans opened inside a
+# trace() on the same thread are also collected in order, which is how the
+# Streamlit debug panel shows the breakdown of one page rerun. Work handed to
+# other threads joins the caller's trace through current_trace()/attach().
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+MAX_SAMPLES = 1000
+
+
+class _Series:
+    __slots__ = ("samples", "count", "errors", "total")
+
+    def __init__(self):
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+
+
+class Metrics:
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._series = defaultdict(_Series)
+        self._local = threading.local()
+
+    # Time the block under `name`; exceptions are counted and re-raised
+    @contextmanager
+    def span(self, name):
+        trace = getattr(self._local, "trace", None)
+        start = self._clock()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = self._clock() - start
+            self.observe(name, elapsed, failed)
+            if trace is not None:
+                trace.append((name, start - trace.started, elapsed, failed))
+
+    # Decorator form of span()
+    def timed(self, name):
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def observe(self, name, seconds, failed=False):
+        with self._lock:
+            series = self._series[name]
+            series.samples.append(seconds)
+            series.count += 1
+            series.total += seconds
+            if failed:
+                series.errors += 1
+
+    # Collect this thread's spans while the block runs; yields the list of
+    # (name, start offset, seconds, failed) tuples
+    @contextmanager
+    def trace(self):
+        previous = getattr(self._local, "trace", None)
+        trace = self.start_trace()
+        try:
+            yield trace
+        finally:
+            self._local.trace = previous
+
+    # Start collecting this thread's spans (for scripts that cannot wrap
+    # themselves in trace()); returns the list they are collected in
+    def start_trace(self):
+        trace = self._local.trace = _Trace(self._clock())
+        return trace
+
+    def stop_trace(self):
+        self._local.trace = None
+
+    # This thread's trace (None outside one), to hand to worker threads
+    def current_trace(self):
+        return getattr(self._local, "trace", None)
+
+    # Collect this thread's spans into `trace` (another thread's) while the block runs
+    @contextmanager
+    def attach(self, trace):
+        previous = getattr(self._local, "trace", None)
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            self._local.trace = previous
+
+    # name -> count, errors, mean/p50/p95/max in milliseconds
+    def summary(self):
+        with self._lock:
+            series = {name: (np.array(s.samples), s.count, s.errors, s.total) for name, s in self._series.items()}
+        summary = {}
+        for name, (samples, count, errors, total) in sorted(series.items()):
+            p50, p95 = np.percentile(samples, [50, 95]) * 1000 if len(samples) else (0.0, 0.0)
+            summary[name] = {
+                "count": count,
+                "errors": errors,
+                "mean_ms": total / count * 1000 if count else 0.0,
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "max_ms": float(samples.max() * 1000) if len(samples) else 0.0,
+            }
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class _Trace(list):
+    def __init__(self, started):
+        super().__init__()
+        self.started = started
+
+
+# Process-wide metrics shared by the page, the core and the service
+metrics = Metrics()
@@ -0,0 +1,192 @@
+# Gold news ingestion: background NewsAPI poller, deduplicated local store and keyword index
+#
+# NewsPoller fetches on a fixed interval (conditional requests, only articles
+# newer than the newest stored one, exponential backoff on failures) into a
+# NewsStore. The store keeps articles in SQLite, deduplicated by URL/title
+# hash, and serves pages and keyword searches from memory.
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from assistant import normalize_query
+from metrics import metrics
+
+NEWS_API_URL = "https://newsapi.org/v2/everything"
+POLL_INTERVAL = 1800  # 48 requests a day, within the NewsAPI free plan
+RETRY_DELAY = 60
+MAX_BACKOFF = 3600
+
+
+# Stable key for an article: hash of its URL, or of its title when it has none
+def article_key(article):
+    source = (article.get("url") or "").strip().lower() or normalize_query(article.get("title") or "")
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+# Searchable words of a text (normalized; one-letter words skipped)
+def tokenize(text):
+    return {word for word in normalize_query(text or "").split() if len(word) > 1}
+
+
+class NewsStore:
+    def __init__(self, path, max_articles=1000):
+        self.max_articles = max_articles
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS articles (key TEXT PRIMARY KEY, published_at TEXT NOT NULL, data TEXT NOT NULL)")
+        self._articles = {}
+        self._order = []
+        self._index = defaultdict(set)
+        rows = self._conn.execute("SELECT key, data FROM articles ORDER BY published_at DESC LIMIT ?", (max_articles,)).fetchall()
+        for key, data in rows:
+            self._remember(key, json.loads(data))
+        self._sort()
+
+    def __len__(self):
+        return len(self._order)
+
+    # Newest publishedAt in the store (ISO string) or None
+    @property
+    def newest(self):
+        with self._lock:
+            return self._articles[self._order[0]].get("publishedAt") if self._order else None
+
+    # Store new articles, skipping ones already seen; returns how many were new
+    def add(self, articles):
+        new = []
+        with self._lock:
+            for article in articles:
+                key = article_key(article)
+                if key in self._articles or not article.get("title"):
+                    continue
+                self._remember(key, article)
+                new.append((key, article.get("publishedAt") or "", json.dumps(article, ensure_ascii=False)))
+            if not new:
+                return 0
+            self._sort()
+            evicted = self._order[self.max_articles:]
+            del self._order[self.max_articles:]
+            for key in evicted:
+                self._forget(key)
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO articles (key, published_at, data) VALUES (?, ?, ?)", new)
+                if evicted:
+                    self._conn.executemany("DELETE FROM articles WHERE key = ?", [(key,) for key in evicted])
+        return len(new)
+
+    # Newest articles, one page at a time (pages start at 1); returns (articles, total)
+    def latest(self, page=1, page_size=3):
+        with self._lock:
+            keys = self._order
+            return [self._articles[k] for k in keys[(page - 1) * page_size:page * page_size]], len(keys)
+
+    # Articles matching any word of the query, most matched words first, then
+    # newest first; returns (articles, total)
+    def search(self, query, page=1, page_size=3):
+        words = tokenize(query)
+        with self._lock:
+            scores = defaultdict(int)
+            for word in words:
+                for key in self._index.get(word, ()):
+                    scores[key] += 1
+            rank = {key: i for i, key in enumerate(self._order)}
+            keys = sorted(scores, key=lambda k: (-scores[k], rank[k]))
+            return [self._articles[k] for k in keys[(page - 1) * page_size:page * page_size]], len(keys)
+
+    # Caller must hold the lock (or be __init__)
+    def _remember(self, key, article):
+        self._articles[key] = article
+        self._order.append(key)
+        for word in tokenize(f"{article.get('title')} {article.get('description')}"):
+            self._index[word].add(key)
+
+    # Caller must hold the lock
+    def _forget(self, key):
+        article = self._articles.pop(key)
+        for word in tokenize(f"{article.get('title')} {article.get('description')}"):
+            keys = self._index.get(word)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[word]
+
+    # Caller must hold the lock (or be __init__)
+    def _sort(self):
+        self._order.sort(key=lambda k: self._articles[k].get("publishedAt") or "", reverse=True)
+
+
+class NewsPoller:
+    def __init__(self, store, api_key, query="gold egypt", interval=POLL_INTERVAL,
+                 retry_delay=RETRY_DELAY, max_backoff=MAX_BACKOFF, url=NEWS_API_URL, session=None, timeout=10):
+        self.store = store
+        self.api_key = api_key
+        self.query = query
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.url = url
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.failures = 0
+        self.last_success = None
+        self.last_error = None
+        self._validators = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    # One conditional fetch; returns the number of new articles
+    def fetch_once(self):
+        params = {"q": self.query, "sortBy": "publishedAt", "pageSize": 100, "apiKey": self.api_key}
+        if self.store.newest:
+            params["from"] = self.store.newest
+        headers = {}
+        if "etag" in self._validators:
+            headers["If-None-Match"] = self._validators["etag"]
+        if "last_modified" in self._validators:
+            headers["If-Modified-Since"] = self._validators["last_modified"]
+        with metrics.span("upstream.newsapi"):
+            response = self.session.get(self.url, params=params, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return 0
+        response.raise_for_status()
+        if "ETag" in response.headers:
+            self._validators["etag"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            self._validators["last_modified"] = response.headers["Last-Modified"]
+        return self.store.add(response.json().get("articles", []))
+
+    # Seconds until the next poll: the interval, or a jittered exponential backoff after failures
+    def next_delay(self):
+        if not self.failures:
+            return self.interval
+        return min(self.max_backoff, self.retry_delay * 2 ** (self.failures - 1)) * random.uniform(0.8, 1.2)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="news-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.fetch_once()
+                self.failures = 0
+                self.last_success = time.time()
+                self.last_error = None
+            # Any error (network, bad JSON, a locked news.db, a missing fixture)
+            # is recorded and retried with backoff; the thread keeps running
+            except Exception as e:
+                self.failures += 1
+                self.last_error = e
+            self._stop.wait(self.next_delay())
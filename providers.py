@@ -0,0 +1,217 @@
+# Upstream provider layer: pooled connections, deadlines, hedging and circuit breakers
+#
+# Every upstream (Yahoo Finance, Alpha Vantage, exchange rates, NewsAPI) is a
+# named provider with its own deadline and circuit breaker. Calls run on a
+# shared thread pool over one keep-alive requests.Session, so independent
+# calls go out together and a page waits for the slowest deadline, not for
+# the sum of all calls. A provider that keeps failing (or keeps missing its
+# deadline) is skipped until its breaker lets a probe call through again.
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import requests
+import yfinance as yf
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT = 60.0
+POOL_SIZE = 20
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+# Opens after failure_threshold consecutive failures; after reset_timeout
+# seconds one probe call is let through, and its outcome closes or reopens it
+class CircuitBreaker:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    # Whether a call may go out now (claims the probe slot when half open)
+    def allow(self):
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+
+class Provider:
+    __slots__ = ("name", "fetch", "deadline", "breaker")
+
+    def __init__(self, name, fetch, deadline, breaker):
+        self.name = name
+        self.fetch = fetch
+        self.deadline = deadline
+        self.breaker = breaker
+
+
+class ProviderPool:
+    def __init__(self, max_workers=16, pool_size=POOL_SIZE):
+        # Provider calls never wait on other futures; gather() tasks may wait
+        # on provider calls, so they get their own threads to avoid deadlock
+        self._calls = ThreadPoolExecutor(max_workers, thread_name_prefix="provider")
+        self._tasks = ThreadPoolExecutor(max_workers, thread_name_prefix="fanout")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._providers = {}
+        self._tickers = {}
+
+    # Add a provider, or update the fetch function and deadline of an existing
+    # one (its breaker state is kept, so Streamlit reruns can re-register)
+    def register(self, name, fetch, deadline, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        with self._lock:
+            provider = self._providers.get(name)
+            if provider is None:
+                provider = self._providers[name] = Provider(name, fetch, deadline, CircuitBreaker(failure_threshold, reset_timeout))
+            else:
+                provider.fetch = fetch
+                provider.deadline = deadline
+            return provider
+
+    # Replace a provider's fetch with wrapper(fetch), e.g. to record or replay it
+    def wrap(self, name, wrapper):
+        with self._lock:
+            provider = self._providers[name]
+            provider.fetch = wrapper(provider.fetch)
+
+    def deadline(self, name):
+        return self._providers[name].deadline
+
+    # One yf.Ticker per symbol, reused across calls
+    def ticker(self, symbol):
+        with self._lock:
+            ticker = self._tickers.get(symbol)
+            if ticker is None:
+                ticker = self._tickers[symbol] = yf.Ticker(symbol)
+            return ticker
+
+    # Future for fetch(*args) of the named provider; fails at once with
+    # CircuitOpenError while the provider's breaker is open
+    def submit(self, name, *args):
+        provider = self._providers[name]
+        if not provider.breaker.allow():
+            future = Future()
+            future.set_exception(CircuitOpenError(f"{name} is temporarily disabled after repeated failures"))
+            return future
+        return self._calls.submit(self._run, provider, args, metrics.current_trace())
+
+    # fetch(*args) of the named provider, waiting at most its deadline
+    def call(self, name, *args):
+        future = self.submit(name, *args)
+        try:
+            return future.result(timeout=self._providers[name].deadline)
+        except (TimeoutError, FutureTimeoutError):  # distinct classes before Python 3.11
+            raise TimeoutError(f"{name} did not answer within {self._providers[name].deadline:g}s") from None
+
+    # Ask primary; if it has not answered after hedge_after seconds (or has
+    # failed), also ask secondary and take the first good answer.
+    # Returns (value, provider name).
+    def hedged(self, primary, secondary, hedge_after, args=()):
+        first = self.submit(primary, *args)
+        start = time.monotonic()
+        done, _ = wait([first], timeout=hedge_after)
+        if done and first.exception() is None:
+            return first.result(), primary
+        second = self.submit(secondary, *args)
+        pending = {first: primary, second: secondary}
+        end = max(start + self.deadline(primary), time.monotonic() + self.deadline(secondary))
+        error = None
+        while pending:
+            done, _ = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                name = pending.pop(future)
+                if future.exception() is None:
+                    return future.result(), name
+                error = future.exception()
+        raise error or TimeoutError(f"{primary} and {secondary} did not answer in time")
+
+    # Run independent callables concurrently and wait at most `timeout` seconds
+    # for all of them. Returns key -> result, or the exception it raised
+    # (TimeoutError for ones still running; they keep running in the background).
+    def gather(self, tasks, timeout):
+        trace = metrics.current_trace()
+        futures = {key: self._tasks.submit(self._traced, trace, task) for key, task in tasks.items()}
+        wait(futures.values(), timeout=timeout)
+        results = {}
+        for key, future in futures.items():
+            if not future.done():
+                results[key] = TimeoutError(f"{key} did not finish within {timeout:g}s")
+            elif future.exception() is not None:
+                results[key] = future.exception()
+            else:
+                results[key] = future.result()
+        return results
+
+    # Breaker state per provider
+    def status(self):
+        with self._lock:
+            providers = list(self._providers.values())
+        return {provider.name: provider.breaker.state for provider in providers}
+
+    # task() with its spans in the caller's trace
+    @staticmethod
+    def _traced(trace, task):
+        with metrics.attach(trace):
+            return task()
+
+    # A call counts as a failure when it raises or misses its deadline. Its
+    # span goes to the trace of the thread that submitted it.
+    def _run(self, provider, args, trace=None):
+        start = time.monotonic()
+        try:
+            with metrics.attach(trace), metrics.span(f"upstream.{provider.name}"):
+                value = provider.fetch(*args)
+        except Exception:
+            provider.breaker.record_failure()
+            raise
+        if time.monotonic() - start > provider.deadline:
+            provider.breaker.record_failure()
+        else:
+            provider.breaker.record_success()
+        return value
+
+
+# Process-wide provider pool shared by all sessions
+providers = ProviderPool()
@@ -0,0 +1,328 @@
+# Portfolio PDF statements rendered in batches on a process pool
+#
+# build_statements() turns ledger data into plain, picklable statement dicts
+# (summary, lot rows, chart series). ReportRenderer renders them on worker
+# processes that register the font once, and returns a ReportJob handle right
+# away; each report is written straight to its own file (or returned as
+# bytes), so the caller never holds more than one finished report at a time.
+# Arabic text is shaped when arabic_reshaper and python-bidi are installed.
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from ledger import BUY, revalue_lots, value_history
+from metrics import metrics
+
+try:
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+except ImportError:
+    arabic_reshaper = None
+
+# Fonts tried in order when none is given; Helvetica (no Arabic glyphs) otherwise
+FONT_CANDIDATES = (
+    "C:/Windows/Fonts/arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+)
+
+# Job directories under a reports directory older than this are removed
+REPORT_MAX_AGE = 24 * 3600
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 40
+ROW_HEIGHT = 14
+CHART_HEIGHT = 130
+CHART_POINTS = 400  # chart series are downsampled to at most this many points
+FIRST_PAGE_ROWS = 18
+PAGE_ROWS = int((PAGE_HEIGHT - 2 * MARGIN - 60) // ROW_HEIGHT)
+
+LABELS = {
+    "en": {
+        "title": "Portfolio Statement", "owner": "Owner", "portfolio": "Portfolio", "date": "Date",
+        "grams": "Gold held (grams)", "value": "Current value (EGP)", "cost_basis": "Cost basis (EGP)",
+        "realized_pl": "Realized P/L (EGP)", "unrealized_pl": "Unrealized P/L (EGP)",
+        "price_chart": "21K price (EGP/gram)", "value_chart": "Portfolio value (EGP)",
+        "columns": ["Date", "Side", "Karat", "Grams", "Price (EGP/g)", "Amount (EGP)"],
+        "buy": "Buy", "sell": "Sell", "no_lots": "No transactions", "page": "Page {page} of {pages}",
+    },
+    "ar": {
+        "title": "كشف حساب المحفظة", "owner": "المستخدم", "portfolio": "المحفظة", "date": "التاريخ",
+        "grams": "كمية الذهب (جرام)", "value": "القيمة الحالية (جنيه)", "cost_basis": "تكلفة الرصيد (جنيه)",
+        "realized_pl": "ربح محقق (جنيه)", "unrealized_pl": "ربح غير محقق (جنيه)",
+        "price_chart": "سعر عيار 21 (جنيه/جرام)", "value_chart": "قيمة المحفظة (جنيه)",
+        "columns": ["التاريخ", "العملية", "العيار", "جرام", "السعر (جنيه/جرام)", "المبلغ (جنيه)"],
+        "buy": "شراء", "sell": "بيع", "no_lots": "لا توجد عمليات", "page": "صفحة {page} من {pages}",
+    },
+}
+
+_ARABIC = re.compile(r"[\u0600-\u06ff]")
+
+
+# Arabic text in visual order with joined letter forms (unchanged without the shaping libraries)
+def shape(text):
+    if arabic_reshaper is None or not _ARABIC.search(text):
+        return text
+    return get_display(arabic_reshaper.reshape(text))
+
+
+# First existing font file from FONT_CANDIDATES, or None
+def find_font(candidates=FONT_CANDIDATES):
+    return next((path for path in candidates if path and os.path.exists(path)), None)
+
+
+# Registered font name for a TTF file; registration happens once per process
+@lru_cache(maxsize=None)
+def _font(font_path):
+    if font_path is None:
+        return "Helvetica"
+    name = os.path.splitext(os.path.basename(font_path))[0]
+    pdfmetrics.registerFont(TTFont(name, font_path))
+    return name
+
+
+# Left edge of each lot-table column (mirrored for right-to-left pages)
+@lru_cache(maxsize=None)
+def _column_edges(n_columns, rtl):
+    width = (PAGE_WIDTH - 2 * MARGIN) / n_columns
+    edges = [MARGIN + i * width for i in range(n_columns)]
+    return tuple(reversed(edges)) if rtl else tuple(edges), width
+
+
+# Statement dicts for portfolios (a ledger.portfolios() frame), valued at
+# prices (karat -> EGP/gram) with charts over history (date index, one
+# EGP/gram column per karat)
+@metrics.timed("reports.build_statements")
+def build_statements(ledger, portfolios, prices, history, method="fifo", language="en", date=None):
+    labels = LABELS[language]
+    date = date or time.strftime("%Y-%m-%d")
+    lots = ledger.lots(portfolios["id"])
+    summaries = revalue_lots(lots, prices, method)
+    values = value_history(lots, history.index, {k: history[k].to_numpy() for k in history.columns})
+    dates = history.index.strftime("%Y-%m-%d").to_numpy()
+    price_column = "21K" if "21K" in history.columns else history.columns[0]
+    lots_by_portfolio = dict(tuple(lots.groupby("portfolio_id"))) if not lots.empty else {}
+    statements = []
+    for portfolio_id, owner, name in portfolios[["id", "owner", "name"]].itertuples(index=False):
+        portfolio_lots = lots_by_portfolio.get(portfolio_id)
+        rows = []
+        if portfolio_lots is not None:
+            for ts, side, karat, grams, price in portfolio_lots.sort_values("ts")[["ts", "side", "karat", "grams", "price"]].itertuples(index=False):
+                rows.append((ts.strftime("%Y-%m-%d"), labels["buy"] if side == BUY else labels["sell"], karat, f"{grams:,.2f}", f"{price:,.2f}", f"{grams * price:,.2f}"))
+        summary = summaries.loc[portfolio_id] if portfolio_id in summaries.index else None
+        charts = [(labels["price_chart"], dates, history[price_column].to_numpy())]
+        if portfolio_id in values.columns:
+            charts.append((labels["value_chart"], dates, values[portfolio_id].to_numpy()))
+        statements.append({
+            "filename": f"statement_{portfolio_id}_{date}.pdf",
+            "language": language,
+            "header": [(labels["owner"], owner), (labels["portfolio"], name), (labels["date"], date)],
+            "summary": [(labels[key], f"{summary[key] if summary is not None else 0.0:,.2f}")
+                        for key in ("grams", "value", "cost_basis", "realized_pl", "unrealized_pl")],
+            "rows": rows,
+            "charts": charts,
+        })
+    return statements
+
+
+# Render one statement to `out` (a file path or a writable binary file)
+def render_statement(statement, out, font_path=None):
+    language = statement.get("language", "en")
+    labels = LABELS[language]
+    rtl = language == "ar"
+    font = _font(font_path)
+    rows = statement["rows"]
+    pages = 1 + max(0, -(-(len(rows) - FIRST_PAGE_ROWS) // PAGE_ROWS))
+    c = canvas.Canvas(out, pagesize=A4, pageCompression=1)
+    c.setTitle(labels["title"])
+
+    # Page frame drawn once per document and reused on every page
+    c.beginForm("frame")
+    c.setLineWidth(0.5)
+    c.line(MARGIN, PAGE_HEIGHT - MARGIN - 22, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN - 22)
+    c.line(MARGIN, MARGIN + 12, PAGE_WIDTH - MARGIN, MARGIN + 12)
+    c.setFont(font, 14)
+    _text(c, labels["title"], PAGE_HEIGHT - MARGIN - 14, rtl)
+    c.endForm()
+
+    def start_page(page):
+        c.doForm("frame")
+        c.setFont(font, 8)
+        _text(c, labels["page"].format(page=page, pages=pages), MARGIN, not rtl)
+        c.setFont(font, 9)
+
+    start_page(1)
+    y = PAGE_HEIGHT - MARGIN - 40
+    for label, value in statement["header"] + statement["summary"]:
+        _text(c, f"{label}: {value}", y, rtl)
+        y -= ROW_HEIGHT
+    for title, dates, values in statement["charts"]:
+        y -= 10
+        _chart(c, title, dates, values, MARGIN, y - CHART_HEIGHT, PAGE_WIDTH - 2 * MARGIN, CHART_HEIGHT, font)
+        y -= CHART_HEIGHT + 10
+    c.setFont(font, 9)
+
+    page, start, limit = 1, 0, FIRST_PAGE_ROWS
+    y -= ROW_HEIGHT
+    while True:
+        _row(c, labels["columns"], y, rtl, header=True)
+        for row in rows[start:start + limit]:
+            y -= ROW_HEIGHT
+            _row(c, row, y, rtl)
+        if not rows:
+            _text(c, labels["no_lots"], y - ROW_HEIGHT, rtl)
+        start += limit
+        if start >= len(rows):
+            break
+        c.showPage()
+        page += 1
+        start_page(page)
+        y = PAGE_HEIGHT - MARGIN - 40
+        limit = PAGE_ROWS
+    c.showPage()
+    c.save()
+
+
+def _text(c, text, y, rtl):
+    if rtl:
+        c.drawRightString(PAGE_WIDTH - MARGIN, y, shape(text))
+    else:
+        c.drawString(MARGIN, y, shape(text))
+
+
+def _row(c, cells, y, rtl, header=False):
+    edges, width = _column_edges(len(cells), rtl)
+    for x, cell in zip(edges, cells):
+        text = shape(str(cell))
+        if rtl:
+            c.drawRightString(x + width - 4, y, text)
+        else:
+            c.drawString(x + 4, y, text)
+    if header:
+        c.line(MARGIN, y - 4, PAGE_WIDTH - MARGIN, y - 4)
+
+
+# Line chart of values over dates (strings), downsampled to CHART_POINTS
+def _chart(c, title, dates, values, x, y, width, height, font):
+    c.setFont(font, 9)
+    c.drawString(x, y + height + 2, shape(title))
+    c.rect(x, y, width, height, stroke=1, fill=0)
+    values = np.asarray(values, dtype="f8")
+    if len(values) < 2 or not np.isfinite(values).any():
+        return
+    picks = np.unique(np.linspace(0, len(values) - 1, min(len(values), CHART_POINTS)).astype(int))
+    points = values[picks]
+    low, high = np.nanmin(points), np.nanmax(points)
+    span = high - low or 1.0
+    xs = x + width * picks / (len(values) - 1)
+    ys = y + 4 + (height - 8) * (points - low) / span
+    path = c.beginPath()
+    path.moveTo(xs[0], ys[0])
+    for px, py in zip(xs[1:], ys[1:]):
+        path.lineTo(px, py)
+    c.drawPath(path, stroke=1, fill=0)
+    c.setFont(font, 7)
+    c.drawString(x + 2, y + height - 9, f"{high:,.2f}")
+    c.drawString(x + 2, y + 3, f"{low:,.2f}")
+    c.drawString(x, y - 9, str(dates[0]))
+    c.drawRightString(x + width, y - 9, str(dates[-1]))
+
+
+# Worker task: write the report to out_dir and return its path, or return its bytes
+def _render_task(statement, out_dir, font_path):
+    if out_dir is None:
+        buffer = io.BytesIO()
+        render_statement(statement, buffer, font_path)
+        return buffer.getvalue()
+    path = os.path.join(out_dir, statement["filename"])
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        render_statement(statement, f, font_path)
+    os.replace(tmp, path)
+    return path
+
+
+def _init_worker(font_path):
+    _font(font_path)
+
+
+# Remove job directories under out_dir last modified more than max_age seconds ago
+def prune_reports(out_dir, max_age=REPORT_MAX_AGE):
+    cutoff = time.time() - max_age
+    for entry in os.scandir(out_dir):
+        if entry.name.startswith("job-") and entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+# Handle for a submitted batch; results keep the statements' order
+class ReportJob:
+    def __init__(self, futures, directory=None):
+        self.futures = list(futures)
+        self.directory = directory
+        self.submitted_at = time.time()
+
+    def __len__(self):
+        return len(self.futures)
+
+    @property
+    def completed(self):
+        return sum(future.done() for future in self.futures)
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def progress(self):
+        return self.completed / len(self.futures) if self.futures else 1.0
+
+    # Paths (or bytes) of the finished reports; raises the first error
+    def results(self, timeout=None):
+        return [future.result(timeout) for future in self.futures]
+
+    def errors(self):
+        return [future.exception() for future in self.futures if future.done() and future.exception() is not None]
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+
+class ReportRenderer:
+    def __init__(self, max_workers=None, font_path=None):
+        self.font_path = font_path if font_path is not None else find_font()
+        # Spawned, not forked: the renderer lives in multithreaded processes
+        # (the Streamlit server), and forking those can deadlock the workers
+        self._pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                                         mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_worker, initargs=(self.font_path,))
+
+    # Start rendering statements; each is written to a new job directory under
+    # out_dir (created if needed), so concurrent exports never share files, or,
+    # without out_dir, returned as bytes
+    def submit(self, statements, out_dir=None):
+        job_dir = None
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+            prune_reports(out_dir)
+            job_dir = tempfile.mkdtemp(prefix=time.strftime("job-%Y%m%d-%H%M%S-"), dir=out_dir)
+        return ReportJob((self._pool.submit(_render_task, statement, job_dir, self.font_path) for statement in statements),
+                         job_dir)
+
+    def shutdown(self, wait=True):
+        if sys.version_info >= (3, 9):
+            self._pool.shutdown(wait=wait, cancel_futures=not wait)
+        else:  # no cancel_futures before Python 3.9
+            self._pool.shutdown(wait=wait)
+
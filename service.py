@@ -0,0 +1,254 @@
+# Async HTTP service over the headless core (JSON endpoints)
+#
+#   python service.py --port 8080 --workers 4
+#
+#   GET /health
+#   GET /quote                                    latest price in every karat, unit and currency
+#   GET /convert?quantity=2&karat=21K&unit=gold_pound&currency=EGP
+#   GET /plan?monthly_amount=1000&months=12[&goal=10][&projection=1]    months up to MAX_MONTHS
+#   GET /portfolio/{id}/value[?method=average]
+#   GET /metrics                                  latency per span, cache counters, breaker states
+#
+# A background task refreshes the quote every QUOTE_REFRESH seconds and keeps
+# it as a price matrix and a ready-made JSON body, so /quote and /convert never
+# wait on upstream calls. Blocking work (projections, ledger reads) runs on
+# the default thread pool. Each worker is a separate process listening on the
+# same port (SO_REUSEPORT), and the kernel spreads connections between them.
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from aiohttp import web
+
+from core import GoldCore, API_KEYS, DATA_DIR, load_config, savings_plan
+from fixtures import Fixtures
+from market_cache import market_cache
+from metrics import metrics
+from providers import providers
+
+QUOTE_REFRESH = 15
+MONTHLY_PRICES_REFRESH = 3600
+MAX_PATHS = 20000
+MAX_MONTHS = 600
+
+# Everything the handlers and the refresh task share; the app itself is frozen
+# once it starts, so the task mutates this object instead of app[...]
+STATE = web.AppKey("state", SimpleNamespace)
+
+
+def json_response(data, status=200):
+    return web.Response(body=json.dumps(data, ensure_ascii=False).encode("utf-8"), status=status,
+                        content_type="application/json")
+
+
+def bad_request(message):
+    return web.HTTPBadRequest(text=json.dumps({"error": message}, ensure_ascii=False), content_type="application/json")
+
+
+# Query parameter converted with `kind`; a missing parameter without default,
+# or a value that is not a finite number, is a 400
+def param(request, name, kind=float, default=None):
+    value = request.query.get(name)
+    if value is None:
+        if default is None:
+            raise bad_request(f"missing parameter: {name}")
+        return default
+    try:
+        converted = kind(value)
+    except ValueError:
+        raise bad_request(f"invalid {name}: {value}") from None
+    if not math.isfinite(converted):
+        raise bad_request(f"invalid {name}: {value}")
+    return converted
+
+
+# Latest quote as served by /quote and used by /convert
+class QuoteSnapshot:
+    def __init__(self, price):
+        self.matrix = price["matrix"]
+        self.updated_at = time.time()
+        self.karat_prices = {k: self.matrix.get(k, "gram", "EGP")[0] for k in self.matrix.karats}
+        self.body = json.dumps({
+            "usd_per_oz": price["usd_per_oz"],
+            "egp_per_gram_21k": price["egp_per_gram_21k"],
+            "prices": {currency: self.matrix.table(currency).to_dict(orient="index") for currency in self.matrix.currencies},
+            "messages": [message for _, message in price["messages"]],
+            "fallback": price["fallback"],
+            "updated_at": self.updated_at,
+        }, ensure_ascii=False).encode("utf-8")
+
+
+async def refresh_quote(app):
+    loop = asyncio.get_running_loop()
+    state = app[STATE]
+    while True:
+        try:
+            state.quote = QuoteSnapshot(await loop.run_in_executor(None, state.core.current_price))
+            if time.time() - state.monthly_prices_at >= MONTHLY_PRICES_REFRESH:
+                state.monthly_prices = await loop.run_in_executor(None, state.core.monthly_prices_egp)
+                state.monthly_prices_at = time.time()
+        except Exception as e:
+            state.refresh_error = str(e)
+        await asyncio.sleep(QUOTE_REFRESH)
+
+
+async def start_background(app):
+    app[STATE].refresh_task = asyncio.create_task(refresh_quote(app))
+
+
+async def stop_background(app):
+    app[STATE].refresh_task.cancel()
+
+
+def snapshot(request):
+    quote = request.app[STATE].quote
+    if quote is None:
+        raise web.HTTPServiceUnavailable(text=json.dumps({"error": "quote not loaded yet"}), content_type="application/json")
+    return quote
+
+
+async def health(request):
+    quote = request.app[STATE].quote
+    return json_response({"status": "ok" if quote is not None else "starting",
+                          "quote_age": time.time() - quote.updated_at if quote is not None else None})
+
+
+async def quote(request):
+    return web.Response(body=snapshot(request).body, content_type="application/json")
+
+
+async def convert(request):
+    quote = snapshot(request)
+    quantity = param(request, "quantity", float, 1.0)
+    try:
+        result = request.app[STATE].core.convert(quantity, request.query.get("karat", "21K"), request.query.get("unit", "gram"),
+                                             request.query.get("currency", "EGP"), quote.matrix)
+    except ValueError as e:
+        raise bad_request(str(e)) from None
+    return json_response(result)
+
+
+async def plan(request):
+    quote = snapshot(request)
+    monthly_amount = param(request, "monthly_amount")
+    months = param(request, "months", int, 12)
+    if months > MAX_MONTHS:
+        raise bad_request(f"months must be at most {MAX_MONTHS}")
+    goal = param(request, "goal", float, 0.0) or None
+    price = param(request, "price", float, 0.0) or quote.karat_prices["21K"]
+    projection = request.query.get("projection") in ("1", "true")
+    monthly_prices = request.app[STATE].monthly_prices if projection else None
+    n_paths = min(param(request, "paths", int, 5000), MAX_PATHS)
+    if n_paths < 1:
+        raise bad_request("paths must be at least 1")
+    try:
+        if monthly_prices is None:
+            result = savings_plan(monthly_amount, months, price, goal=goal)
+        else:
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: savings_plan(monthly_amount, months, price, monthly_prices, goal, n_paths))
+    except ValueError as e:
+        raise bad_request(str(e)) from None
+    body = {key: result[key] for key in ("monthly_amount", "months", "total_amount", "grams")}
+    body["price_per_gram"] = price
+    if "backtest" in result:
+        grams = result["backtest"]["grams"]
+        if len(grams):
+            body["backtest"] = {"start_months": len(grams), "median_grams": float(np.median(grams)),
+                                "min_grams": float(grams.min()), "max_grams": float(grams.max())}
+        bands = result["projection"]["bands"]
+        body["projection"] = {f"p{p}": float(bands[i, -1]) for i, p in enumerate(result["projection"]["percentiles"])}
+        if goal is not None:
+            body["goal_probability"] = result["goal_probability"]
+    return json_response(body)
+
+
+async def portfolio_value(request):
+    try:
+        portfolio_id = int(request.match_info["portfolio_id"])
+    except ValueError:
+        raise bad_request("invalid portfolio id") from None
+    method = request.query.get("method", "fifo")
+    if method not in ("fifo", "average"):
+        raise bad_request(f"unknown method: {method}")
+    quote = snapshot(request)
+    core = request.app[STATE].core
+    values = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: core.portfolio_value([portfolio_id], method, quote.karat_prices))
+    if portfolio_id in values.index:
+        row = values.loc[portfolio_id]
+        return json_response({"portfolio_id": portfolio_id, "method": method, **{k: float(v) for k, v in row.items()}})
+    portfolios = await asyncio.get_running_loop().run_in_executor(None, core.ledger.portfolios)
+    if portfolio_id not in set(portfolios["id"]):
+        raise web.HTTPNotFound(text=json.dumps({"error": "unknown portfolio"}), content_type="application/json")
+    return json_response({"portfolio_id": portfolio_id, "method": method, "grams": 0.0, "cost_basis": 0.0,
+                          "value": 0.0, "realized_pl": 0.0, "unrealized_pl": 0.0})
+
+
+async def metrics_report(request):
+    return json_response({"spans": metrics.summary(), "cache": market_cache.stats(), "providers": providers.status()})
+
+
+# Every request is timed under its route (e.g. "http./quote")
+@web.middleware
+async def timing(request, handler):
+    route = request.match_info.route.resource
+    with metrics.span(f"http.{route.canonical if route is not None else 'unmatched'}"):
+        return await handler(request)
+
+
+def create_app(core=None):
+    app = web.Application(middlewares=[timing])
+    if core is None:
+        config = load_config()
+        core = GoldCore(config, DATA_DIR)
+        # GOLD_FIXTURES=record|replay, as for the Streamlit app
+        fixtures = Fixtures.from_env([config.get(key) for key in API_KEYS])
+        if fixtures is not None:
+            fixtures.install()
+    app[STATE] = SimpleNamespace(core=core, quote=None, monthly_prices=None, monthly_prices_at=0.0,
+                                 refresh_error=None, refresh_task=None)
+    app.router.add_get("/health", health)
+    app.router.add_get("/quote", quote)
+    app.router.add_get("/convert", convert)
+    app.router.add_get("/plan", plan)
+    app.router.add_get("/portfolio/{portfolio_id}/value", portfolio_value)
+    app.router.add_get("/metrics", metrics_report)
+    app.on_startup.append(start_background)
+    app.on_cleanup.append(stop_background)
+    return app
+
+
+def run_worker(host, port):
+    web.run_app(create_app(), host=host, port=port, reuse_port=True, access_log=None, print=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gold Investment System HTTP service")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1, help="processes sharing the port")
+    args = parser.parse_args()
+    if args.workers == 1:
+        run_worker(args.host, args.port)
+        return
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=run_worker, args=(args.host, args.port)) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,118 +1,119 @@
 import streamlit as st
-import yfinance as yf
-import requests
 from langchain_huggingface import HuggingFaceEndpoint
 from datetime import datetime
 import pandas as pd
+import numpy as np
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+import zipfile
+import os
 import time
-import re
+from history_store import PERIOD_OFFSETS
+from conversion import KARATS, karat_prices
+from ledger import BUY, SELL, revalue_lots, value_history
+from alerts import ABOVE, BELOW
+from assistant import LLMBatcher, route_query, ask_llm
+from reports import ReportRenderer, build_statements
+from core import GoldCore, API_KEYS, DATA_DIR, parse_amount, purchase_grams, savings_plan
+from market_cache import market_cache
+from providers import providers
+from metrics import metrics
+from fixtures import Fixtures, REPLAY
 
 # Set page configuration
 st.set_page_config(page_title="Gold Investment System", page_icon="💰", layout="wide")
 
+# Timing spans of this rerun (shown in the debug panel at the end)
+page_trace = metrics.start_trace()
+page_started = time.perf_counter()
+
 # API Keys (store in secrets.toml)
-ALPHA_VANTAGE_API_KEY = st.secrets["ALPHA_VANTAGE_API_KEY"]
-NEWS_API_KEY = st.secrets["NEWS_API_KEY"]
 HUGGINGFACE_API_KEY = st.secrets["HUGGINGFACE_API_KEY"]
-EXCHANGE_RATE_API_KEY = st.secrets["EXCHANGE_RATE_API_KEY"]
 
-# Fetch USD to EGP exchange rate
-def get_usd_to_egp_rate():
-    url = f"https://v6.exchangerate-api.com/v6/{EXCHANGE_RATE_API_KEY}/latest/USD"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        return data["conversion_rates"]["EGP"] if "conversion_rates" in data else 47.5
-    except (requests.RequestException, ValueError):
-        st.warning("تعذر جلب سعر الصرف. يتم استخدام 47.5 جنيه/دولار")
-        return 47.5
-
-# Global cache for gold price
-cached_price = None
-cache_timestamp = 0
-CACHE_DURATION = 300  # 5 minutes in seconds
+# Headless core (market data, history, ledger, alerts, news), shared by all sessions.
+# The page only formats its results; service.py serves the same core over HTTP.
+@st.cache_resource
+def get_core():
+    return GoldCore({key: st.secrets[key] for key in API_KEYS}, DATA_DIR)
+
+core = get_core()
+
+# Record or replay upstream responses when GOLD_FIXTURES is set (see fixtures.py)
+@st.cache_resource
+def get_fixtures():
+    fixtures = Fixtures.from_env([st.secrets.get(key) for key in API_KEYS + ("HUGGINGFACE_API_KEY",)])
+    if fixtures is not None:
+        fixtures.install()
+    return fixtures
+
+fixtures = get_fixtures()
+
+# Show upstream (level, message) pairs from the core
+def show_messages(messages):
+    for level, message in messages:
+        getattr(st, level)(message)
 
 # Fetch current gold price from API, tailored for Egypt
+@metrics.timed("page.current_price")
 def get_current_price(_=None):
-    global cached_price, cache_timestamp
-    current_time = time.time()
-    
-    if cached_price and (current_time - cache_timestamp) < CACHE_DURATION:
-        return cached_price
-    
-    # Try Yahoo Finance first
-    try:
-        gold = yf.Ticker("GC=F")  # Gold futures symbol
-        hist = gold.history(period="1d")
-        if not hist.empty:
-            usd_price_per_oz = hist["Close"].iloc[-1]
-        else:
-            raise ValueError("لا توجد بيانات من Yahoo Finance")
-    except Exception as e:
-        st.warning(f"فشل Yahoo Finance: {str(e)}. الرجوع إلى Alpha Vantage.")
-        # Fallback to Alpha Vantage
-        url = f"https://www.alphavantage.co/query?function=CURRENCY_EXCHANGE_RATE&from_currency=XAU&to_currency=USD&apikey={ALPHA_VANTAGE_API_KEY}"
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            if "Realtime Currency Exchange Rate" in data:
-                usd_price_per_oz = float(data["Realtime Currency Exchange Rate"]["5. Exchange Rate"])
-            else:
-                raise KeyError("البيانات المتوقعة غير موجودة في رد Alpha Vantage")
-        except (requests.RequestException, KeyError, ValueError) as e:
-            st.error(f"فشل Alpha Vantage: {str(e)}. استخدام قيمة افتراضية.")
-            usd_price_per_oz = 2000.0  # Default value
-    
-    # Convert to EGP per gram (21K)
-    egp_rate = get_usd_to_egp_rate()
-    egp_price_per_gram_21k = (usd_price_per_oz * egp_rate / 31.1035) * 0.875
-    cached_price = {
-        "usd_per_oz": usd_price_per_oz,
-        "egp_per_gram_21k": egp_price_per_gram_21k,
+    price = core.current_price()
+    show_messages(price["messages"])
+    egp_price_per_gram_21k = price["egp_per_gram_21k"]
+    return {
+        **price,
         "text": f"سعر الذهب الحالي: {egp_price_per_gram_21k:.2f} جنيه/جرام (21 قيراط)" if st.session_state.get('language', 'العربية') == "العربية" else f"Current gold price: {egp_price_per_gram_21k:.2f} EGP/gram (21K)"
     }
-    cache_timestamp = current_time
-    return cached_price
+
+# Indicator engine over the 21K EGP/gram history, brought up to date
+def get_indicators():
+    return core.indicators()
+
+# Portfolio ledger (buy/sell lots), shared by all sessions
+def get_ledger():
+    return core.ledger
+
+# PDF statement renderer (process pool), shared by all sessions
+@st.cache_resource
+def get_report_renderer():
+    return ReportRenderer(max_workers=2)
+
+# Alert engine polling the quote every 30 seconds, shared by all sessions
+def get_alert_engine():
+    return core.alert_engine
+
+# Month-start 21K EGP/gram prices over the stored history (savings-plan backtests)
+def get_monthly_prices_egp():
+    return core.monthly_prices_egp()
 
 # Historical data
 def get_historical_data(_=None):
     try:
-        gold = yf.Ticker("GC=F")
-        hist = gold.history(period="1y")
-        egp_rate = get_usd_to_egp_rate()
-        avg_usd_price = hist["Close"].mean()
-        avg_egp_price_per_gram_21k = (avg_usd_price * egp_rate / 31.1035) * 0.875
+        avg_egp_price_per_gram_21k = core.price_history_egp("1y").mean()
         return f"متوسط سعر الذهب خلال سنة: {avg_egp_price_per_gram_21k:.2f} جنيه/جرام (21 قيراط)" if st.session_state.get('language', 'العربية') == "العربية" else f"Average gold price over 1 year: {avg_egp_price_per_gram_21k:.2f} EGP/gram (21K)"
     except Exception:
         return "تعذر جلب بيانات الأسعار التاريخية" if st.session_state.get('language', 'العربية') == "العربية" else "Failed to fetch historical price data"
 
-# Fetch news (updated to return list of articles)
-def get_news(_=None):
-    url = f"https://newsapi.org/v2/everything?q=gold+egypt&apiKey={NEWS_API_KEY}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        articles = response.json()["articles"]
-        return articles[:3]
-    except (requests.RequestException, KeyError):
-        return []
+# News poller filling the local news store in the background, shared by all sessions
+def get_news_poller():
+    return core.news_poller
+
+# Fetch news (updated to return list of articles), served from the local store.
+# With a query, articles matching its words come first; otherwise the newest.
+@metrics.timed("page.news")
+def get_news(query=None, page=1, page_size=3):
+    store = get_news_poller().store
+    if query:
+        articles, total = store.search(query, page, page_size)
+        if articles:
+            return articles
+    return store.latest(page, page_size)[0]
 
 # Price change with volatility
+@metrics.timed("page.price_change")
 def get_price_change(_=None):
     try:
-        gold = yf.Ticker("GC=F")
-        hist = gold.history(period="5d")
-        if len(hist) >= 2:
-            today_usd = hist["Close"].iloc[-1]
-            yesterday_usd = hist["Close"].iloc[-2]
-            egp_rate = get_usd_to_egp_rate()
-            change_egp_per_gram = ((today_usd - yesterday_usd) * egp_rate / 31.1035) * 0.875
-            percent_change = (change_egp_per_gram / (yesterday_usd * egp_rate / 31.1035 * 0.875)) * 100
+        change = core.price_change()
+        if change is not None:
+            change_egp_per_gram, percent_change = change
             trend = "قد يرتفع" if change_egp_per_gram > 0 else "قد ينخفض"
             return f"تغير سعر الذهب اليوم: {change_egp_per_gram:.2f} جنيه/جرام ({percent_change:.2f}%) - {trend}" if st.session_state.get('language', 'العربية') == "العربية" else f"Gold price change today: {change_egp_per_gram:.2f} EGP/gram ({percent_change:.2f}%) - {'May rise' if change_egp_per_gram > 0 else 'May fall'}"
         return "لا توجد بيانات كافية" if st.session_state.get('language', 'العربية') == "العربية" else "Insufficient data"
@@ -122,12 +123,12 @@ def get_price_change(_=None):
 # Calculate gold purchase (uses effective price)
 def calculate_gold_purchase(amount_str):
     try:
-        amount = float(amount_str.replace("ج", "").replace(",", ""))
+        amount = parse_amount(amount_str)
         if amount <= 0:
             return "يرجى إدخال مبلغ أكبر من 0" if st.session_state.get('language', 'العربية') == "العربية" else "Please enter an amount greater than 0"
         if "effective_price" in st.session_state and st.session_state.effective_price:
             current_price_egp = st.session_state.effective_price
-            grams = amount / current_price_egp
+            grams = purchase_grams(amount, current_price_egp)
             return f"بـ {amount:.2f} جنيه، يمكنك شراء {grams:.2f} جرام (21 قيراط) بسعر {current_price_egp:.2f} جنيه/جرام" if st.session_state.get('language', 'العربية') == "العربية" else f"With {amount:.2f} EGP, you can buy {grams:.2f} grams (21K) at {current_price_egp:.2f} EGP/gram"
         return "تعذر جلب السعر الحالي" if st.session_state.get('language', 'العربية') == "العربية" else "Failed to fetch current price"
     except ValueError:
@@ -136,13 +137,11 @@ def calculate_gold_purchase(amount_str):
 # Gold savings plan (uses effective price)
 def calculate_savings_plan(amount_str, months=12):
     try:
-        monthly_amount = float(amount_str.replace("ج", "").replace(",", ""))
+        monthly_amount = parse_amount(amount_str)
         if monthly_amount <= 0 or months <= 0:
             return "يرجى إدخال مبلغ شهري وعدد أشهر أكبر من 0" if st.session_state.get('language', 'العربية') == "العربية" else "Please enter a monthly amount and number of months greater than 0"
         if "effective_price" in st.session_state and st.session_state.effective_price:
-            current_price_egp = st.session_state.effective_price
-            total_amount = monthly_amount * months
-            total_grams = total_amount / current_price_egp
+            total_grams = savings_plan(monthly_amount, months, st.session_state.effective_price)["grams"]
             return f"بادخار {monthly_amount:.2f} جنيه شهريًا لمدة {months} شهرًا، يمكنك شراء {total_grams:.2f} جرام (21 قيراط)" if st.session_state.get('language', 'العربية') == "العربية" else f"By saving {monthly_amount:.2f} EGP monthly for {months} months, you can buy {total_grams:.2f} grams (21K)"
         return "تعذر جلب السعر الحالي" if st.session_state.get('language', 'العربية') == "العربية" else "Failed to fetch current price"
     except ValueError:
@@ -163,59 +162,76 @@ with st.sidebar:
         manual_price = st.number_input("سعر الذهب (جنيه/جرام)" if language == "العربية" else "Gold price (EGP/gram)", min_value=0.0, value=0.0, key="manual_price")
     else:
         manual_price = None
+    show_timings = st.checkbox("لوحة التوقيت" if language == "العربية" else "Timing debug panel", key="show_timings")
 
 # Set effective price
+api_price_data = get_current_price()
 if use_manual_price and manual_price > 0:
     effective_price = manual_price
     effective_price_text = f"سعر الذهب الحالي (يدوي): {effective_price:.2f} جنيه/جرام" if language == "العربية" else f"Current gold price (manual): {effective_price:.2f} EGP/gram"
+elif "egp_per_gram_21k" in api_price_data:
+    effective_price = api_price_data["egp_per_gram_21k"]
+    effective_price_text = api_price_data["text"]
 else:
-    api_price_data = get_current_price()
-    if "egp_per_gram_21k" in api_price_data:
-        effective_price = api_price_data["egp_per_gram_21k"]
-        effective_price_text = api_price_data["text"]
-    else:
-        effective_price = None
-        effective_price_text = "تعذر جلب سعر الذهب" if language == "العربية" else "Failed to fetch gold price"
+    effective_price = None
+    effective_price_text = "تعذر جلب سعر الذهب" if language == "العربية" else "Failed to fetch gold price"
 st.session_state.effective_price = effective_price
 st.session_state.effective_price_text = effective_price_text
 
+# Prices for every karat, unit and currency from the latest quote
+UNIT_LABELS = {"gram": "جرام", "ounce": "أونصة", "gold_pound": "جنيه ذهب"} if language == "العربية" else {"gram": "Gram", "ounce": "Ounce", "gold_pound": "Gold Pound"}
+with st.expander("الأسعار حسب العيار" if language == "العربية" else "Prices by Karat"):
+    currency = st.selectbox("العملة" if language == "العربية" else "Currency", api_price_data["matrix"].currencies, key="price_table_currency")
+    st.dataframe(api_price_data["matrix"].table(currency).rename(columns=UNIT_LABELS).round(2))
+
+# HuggingFace model client, created once per process. Set HUGGINGFACE_ENDPOINT_URL
+# in secrets.toml to use another (e.g. local) text-generation endpoint.
+# Replayed fixtures answer without creating the client.
+@st.cache_resource
+@metrics.timed("page.llm_init")
+def get_llm():
+    if fixtures is not None and fixtures.mode == REPLAY:
+        return LLMBatcher(fixtures.llm())
+    endpoint_url = st.secrets.get("HUGGINGFACE_ENDPOINT_URL")
+    if endpoint_url:
+        llm = HuggingFaceEndpoint(endpoint_url=endpoint_url, huggingfacehub_api_token=HUGGINGFACE_API_KEY)
+    else:
+        llm = HuggingFaceEndpoint(repo_id="google/flan-t5-large", huggingfacehub_api_token=HUGGINGFACE_API_KEY)
+    return LLMBatcher(llm if fixtures is None else fixtures.llm(llm))
+
 # Initialize HuggingFace model
 try:
-    llm = HuggingFaceEndpoint(
-        repo_id="google/flan-t5-large",
-        huggingfacehub_api_token=HUGGINGFACE_API_KEY
-    )
+    llm = get_llm()
 except Exception as e:
     st.warning(f"فشل تهيئة نموذج اللغة: {str(e)}. سيتم استخدام الردود الأساسية." if language == "العربية" else f"Failed to initialize language model: {str(e)}. Using basic responses.")
     llm = None
 
 # Custom query processing function
+@metrics.timed("page.process_query")
 def process_query(query):
-    query_lower = query.lower()
-    
-    # Check for keywords related to tools
-    if "سعر" in query_lower or "price" in query_lower:
-        return st.session_state.effective_price_text
-    elif "أخبار" in query_lower or "news" in query_lower:
-        news_articles = get_news()
+    intent = route_query(query)
+
+    # Tool intents first, the language model for everything else
+    # (savings and purchase intents always come with an amount)
+    if intent.name == "savings":
+        return calculate_savings_plan(f"{intent.amount}", intent.months or 12)
+    elif intent.name == "purchase":
+        return calculate_gold_purchase(f"{intent.amount}")
+    elif intent.name == "change":
+        return get_price_change()
+    elif intent.name == "news":
+        news_articles = get_news(query)
         if news_articles:
             return "\n".join([f"{article['title']} - {article['description']}" for article in news_articles])
         else:
             return "تعذر جلب الأخبار" if language == "العربية" else "Failed to fetch news"
-    elif "تغير" in query_lower or "change" in query_lower:
-        return get_price_change()
-    elif "كم ذهب" in query_lower or "how much gold" in query_lower:
-        try:
-            amount_str = re.search(r'\d+', query).group()
-            return calculate_gold_purchase(amount_str)
-        except:
-            return "يرجى إدخال المبلغ بشكل صحيح" if language == "العربية" else "Please enter the amount correctly"
+    elif intent.name == "price":
+        return st.session_state.effective_price_text
     else:
-        # Use the HuggingFace model for general responses
+        # Use the HuggingFace model for general responses (cached by normalized question)
         if llm:
             try:
-                response = llm(query)
-                return response
+                return ask_llm(llm, query)
             except Exception as e:
                 return f"Error generating response: {str(e)}"
         else:
@@ -230,24 +246,87 @@ tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
 # Portfolio Tab
 with tab1:
     st.header("محفظتك" if language == "العربية" else "Your Portfolio")
-    grams_owned = st.number_input("كمية الذهب (جرام)" if language == "العربية" else "Gold Amount (grams)", min_value=0.0, value=0.0)
-    purchase_price_egp = st.number_input("سعر الشراء (جنيه/جرام)" if language == "العربية" else "Purchase Price (EGP/gram)", min_value=0.0, value=0.0)
-    if grams_owned > 0 and purchase_price_egp > 0 and st.session_state.effective_price:
-        current_value = grams_owned * st.session_state.effective_price
-        profit_loss = grams_owned * (st.session_state.effective_price - purchase_price_egp)
-        st.markdown(f"**القيمة الحالية:** {current_value:.2f} جنيه" if language == "العربية" else f"**Current Value:** {current_value:.2f} EGP")
-        st.markdown(f"**الربح/الخسارة:** {profit_loss:.2f} جنيه" if language == "العربية" else f"**Profit/Loss:** {profit_loss:.2f} EGP")
-        if st.button("تصدير تقرير" if language == "العربية" else "Export Report"):
-            buffer = io.BytesIO()
-            p = canvas.Canvas(buffer, pagesize=letter)
-            p.drawString(100, 750, f"تقرير المحفظة - {datetime.now().strftime('%Y-%m-%d')}" if language == "العربية" else f"Portfolio Report - {datetime.now().strftime('%Y-%m-%d')}")
-            p.drawString(100, 730, f"كمية الذهب: {grams_owned:.2f} جرام" if language == "العربية" else f"Gold Amount: {grams_owned:.2f} grams")
-            p.drawString(100, 710, f"القيمة الحالية: {current_value:.2f} جنيه" if language == "العربية" else f"Current Value: {current_value:.2f} EGP")
-            p.drawString(100, 690, f"الربح/الخسارة: {profit_loss:.2f} جنيه" if language == "العربية" else f"Profit/Loss: {profit_loss:.2f} EGP")
-            p.showPage()
-            p.save()
-            buffer.seek(0)
-            st.download_button("تنزيل PDF" if language == "العربية" else "Download PDF", buffer, "portfolio_report.pdf", "application/pdf")
+    ledger = get_ledger()
+    owner = st.text_input("اسم المستخدم" if language == "العربية" else "User name", value="default", key="portfolio_owner")
+    col1, col2 = st.columns([2, 1])
+    with col2:
+        new_portfolio_name = st.text_input("محفظة جديدة" if language == "العربية" else "New portfolio", key="new_portfolio_name")
+        if st.button("إنشاء محفظة" if language == "العربية" else "Create Portfolio") and new_portfolio_name.strip():
+            ledger.create_portfolio(owner, new_portfolio_name.strip())
+    portfolios = ledger.portfolios(owner)
+    portfolio_names = dict(zip(portfolios["id"], portfolios["name"]))
+    with col1:
+        portfolio_id = st.selectbox("المحفظة" if language == "العربية" else "Portfolio", list(portfolio_names), format_func=portfolio_names.get, key="portfolio_id")
+    if portfolio_id is None:
+        st.write("أنشئ محفظة لتسجيل عمليات الشراء والبيع" if language == "العربية" else "Create a portfolio to record your buys and sells")
+    else:
+        with st.form("add_lot", clear_on_submit=True):
+            lot_cols = st.columns(5)
+            side = lot_cols[0].radio("العملية" if language == "العربية" else "Side", [BUY, SELL], format_func=lambda x: ("شراء" if x == BUY else "بيع") if language == "العربية" else ("Buy" if x == BUY else "Sell"))
+            karat = lot_cols[1].selectbox("العيار" if language == "العربية" else "Karat", list(KARATS), index=list(KARATS).index("21K"))
+            grams_lot = lot_cols[2].number_input("الكمية (جرام)" if language == "العربية" else "Amount (grams)", min_value=0.0, value=0.0)
+            price_lot = lot_cols[3].number_input("السعر (جنيه/جرام)" if language == "العربية" else "Price (EGP/gram)", min_value=0.0, value=0.0)
+            lot_date = lot_cols[4].date_input("التاريخ" if language == "العربية" else "Date", value=datetime.now().date())
+            if st.form_submit_button("إضافة" if language == "العربية" else "Add") and grams_lot > 0 and price_lot > 0:
+                try:
+                    ledger.add_lot(portfolio_id, side, grams_lot, price_lot, karat, datetime.combine(lot_date, datetime.now().time()))
+                except ValueError as e:
+                    st.error(str(e))
+        lots = ledger.lots([portfolio_id])
+        if not lots.empty and st.session_state.effective_price:
+            cost_method = st.radio("طريقة حساب التكلفة" if language == "العربية" else "Cost method", ["fifo", "average"], format_func=lambda m: {"fifo": "FIFO", "average": "متوسط التكلفة" if language == "العربية" else "Average cost"}[m], horizontal=True)
+            with metrics.span("page.portfolio_revalue"):
+                summary = revalue_lots(lots, karat_prices(st.session_state.effective_price), cost_method).loc[portfolio_id]
+            current_value = summary["value"]
+            profit_loss = summary["realized_pl"] + summary["unrealized_pl"]
+            metric_cols = st.columns(4)
+            metric_cols[0].metric("القيمة الحالية" if language == "العربية" else "Current Value", f"{current_value:,.2f}")
+            metric_cols[1].metric("تكلفة الرصيد" if language == "العربية" else "Cost Basis", f"{summary['cost_basis']:,.2f}")
+            metric_cols[2].metric("ربح محقق" if language == "العربية" else "Realized P/L", f"{summary['realized_pl']:,.2f}")
+            metric_cols[3].metric("ربح غير محقق" if language == "العربية" else "Unrealized P/L", f"{summary['unrealized_pl']:,.2f}")
+            st.markdown(f"**الربح/الخسارة:** {profit_loss:.2f} جنيه" if language == "العربية" else f"**Profit/Loss:** {profit_loss:.2f} EGP")
+            st.dataframe(lots.drop(columns="portfolio_id").set_index("id"))
+            try:
+                history = core.karat_history_egp("1y")
+                values = value_history(lots, history.index, {k: history[k].to_numpy() for k in history.columns})
+                st.line_chart(values[portfolio_id].rename("القيمة" if language == "العربية" else "Value"))
+            except Exception:
+                st.write("تعذر عرض تاريخ قيمة المحفظة" if language == "العربية" else "Failed to show the portfolio value history")
+            with st.expander("حذف عملية" if language == "العربية" else "Delete a lot"):
+                lot_id = st.selectbox("رقم العملية" if language == "العربية" else "Lot id", lots["id"])
+                if st.button("حذف" if language == "العربية" else "Delete"):
+                    try:
+                        ledger.delete_lot(lot_id)
+                        st.rerun()
+                    except ValueError as e:
+                        st.error(str(e))
+            all_portfolios = st.checkbox("كشوف لكل محافظي" if language == "العربية" else "Statements for all my portfolios")
+            if st.button("تصدير تقرير" if language == "العربية" else "Export Report"):
+                # Rendered on the report process pool; the page keeps a job handle
+                with metrics.span("page.report_export"):
+                    history = core.karat_history_egp("1y")
+                    targets = portfolios if all_portfolios else portfolios[portfolios["id"] == portfolio_id]
+                    statements = build_statements(ledger, targets, karat_prices(st.session_state.effective_price), history,
+                                                  cost_method, "ar" if language == "العربية" else "en")
+                    st.session_state.report_job = get_report_renderer().submit(statements, os.path.join(DATA_DIR, "reports"))
+            report_job = st.session_state.get("report_job")
+            if report_job is not None:
+                if not report_job.done():
+                    st.progress(report_job.progress(), text=f"جاري إعداد التقارير: {report_job.completed}/{len(report_job)}" if language == "العربية" else f"Preparing reports: {report_job.completed}/{len(report_job)}")
+                    st.button("تحديث" if language == "العربية" else "Refresh")
+                elif report_job.errors():
+                    st.error(f"فشل إعداد التقرير: {report_job.errors()[0]}" if language == "العربية" else f"Failed to prepare the report: {report_job.errors()[0]}")
+                else:
+                    paths = report_job.results()
+                    if len(paths) == 1:
+                        with open(paths[0], "rb") as f:
+                            st.download_button("تنزيل PDF" if language == "العربية" else "Download PDF", f.read(), os.path.basename(paths[0]), "application/pdf")
+                    else:
+                        buffer = io.BytesIO()
+                        with zipfile.ZipFile(buffer, "w") as archive:
+                            for path in paths:
+                                archive.write(path, os.path.basename(path))
+                        st.download_button("تنزيل الكشوف (ZIP)" if language == "العربية" else "Download statements (ZIP)", buffer.getvalue(), "statements.zip", "application/zip")
 
 # Investment Calculator Tab
 with tab2:
@@ -273,6 +352,21 @@ with tab2:
                 progress = min(total_grams / savings_goal, 1.0)
                 st.progress(progress)
                 st.write(f"تقدم نحو الهدف: {total_grams:.2f}/{savings_goal:.2f} جرام" if language == "العربية" else f"Progress toward goal: {total_grams:.2f}/{savings_goal:.2f} grams")
+                # The same plan started in every past month, and simulated forward from today's price
+                try:
+                    monthly_prices = get_monthly_prices_egp()
+                    plan = savings_plan(monthly_saving, months, st.session_state.effective_price, monthly_prices, savings_goal)
+                    if len(plan["backtest"]["grams"]):
+                        grams = plan["backtest"]["grams"]
+                        reached = plan["backtest_goal_probability"]
+                        st.write(f"لو بدأت الخطة في أي شهر من آخر {len(grams)} شهرًا: الوسيط {np.median(grams):.2f} جرام (الأسوأ {grams.min():.2f}، الأفضل {grams.max():.2f})، ووصلت للهدف في {reached:.0%} من الحالات" if language == "العربية" else f"Started in any of the last {len(grams)} months: median {np.median(grams):.2f} grams (worst {grams.min():.2f}, best {grams.max():.2f}), goal reached in {reached:.0%} of cases")
+                    projection = plan["projection"]
+                    bands = pd.DataFrame(projection["bands"].T, columns=[f"P{p}" for p in projection["percentiles"]], index=pd.RangeIndex(1, months + 1, name="month"))
+                    st.line_chart(bands[["P5", "P50", "P95"]])
+                    reached = plan["goal_probability"]
+                    st.write(f"احتمال الوصول للهدف حسب {len(projection['final_grams'])} سيناريو: {reached:.0%}" if language == "العربية" else f"Chance of reaching the goal across {len(projection['final_grams'])} simulated paths: {reached:.0%}")
+                except Exception:
+                    st.write("تعذر حساب الاختبار التاريخي والتوقعات" if language == "العربية" else "Failed to compute the backtest and projection")
             else:
                 st.write("تعذر جلب السعر الحالي" if language == "العربية" else "Failed to fetch current price")
 
@@ -283,18 +377,22 @@ with tab3:
     period_map = {"1 شهر": "1mo", "3 أشهر": "3mo", "6 أشهر": "6mo", "سنة": "1y", "سنتان": "2y", "5 سنوات": "5y", "1 month": "1mo", "3 months": "3mo", "6 months": "6mo", "1 year": "1y", "2 years": "2y", "5 years": "5y"}
     if st.button("اعرض الاتجاهات" if language == "العربية" else "Show Trends"):
         try:
-            hist = yf.Ticker("GC=F").history(period=period_map[period])
-            egp_rate = get_usd_to_egp_rate()
-            hist["Close_EGP"] = (hist["Close"] * egp_rate / 31.1035) * 0.875
-            for window in [50, 200]:
-                hist[f"MA{window}"] = hist["Close_EGP"].rolling(window=window).mean()
+            with metrics.span("page.trends"):
+                engine = get_indicators()
+                indicators = engine.frame()
+                hist = indicators[indicators.index >= indicators.index[-1] - PERIOD_OFFSETS[period_map[period]]]
+            hist = hist.rename(columns={"close": "Close_EGP", "sma50": "MA50", "sma200": "MA200"})
             st.line_chart(hist[["Close_EGP", "MA50", "MA200"]])
             avg_return = ((hist["Close_EGP"].iloc[-1] - hist["Close_EGP"].iloc[0]) / hist["Close_EGP"].iloc[0]) * 100
             st.write(f"متوسط العائد خلال {period}: {avg_return:.2f}%" if language == "العربية" else f"Average Return over {period}: {avg_return:.2f}%")
-            change_text = get_price_change()
-            if "تغير سعر الذهب" in change_text or "Gold price change" in change_text:
-                percent_change = float(change_text.split("(")[1].split("%")[0])
-                volatility = min(abs(percent_change) / 5, 1.0)
+            latest = engine.latest()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("RSI (14)", f"{latest['rsi']:.1f}")
+            col2.metric("ATR (14)", f"{latest['atr']:.2f}")
+            col3.metric("التقلب اليومي" if language == "العربية" else "Daily Volatility", f"{latest['volatility'] * 100:.2f}%")
+            if not pd.isna(latest["volatility"]):
+                # 20-day stddev of daily log returns; 2% a day fills the gauge
+                volatility = min(latest["volatility"] * 100 / 2, 1.0)
                 st.progress(volatility)
                 st.write(f"مستوى التقلب: {'عالي' if volatility > 0.7 else 'متوسط' if volatility > 0.3 else 'منخفض'}" if language == "العربية" else f"Volatility Level: {'High' if volatility > 0.7 else 'Medium' if volatility > 0.3 else 'Low'}")
         except Exception:
@@ -308,6 +406,7 @@ with tab4:
     st.write("- كم ذهب أشتري بـ 5000 جنيه؟" if language == "العربية" else "- How much gold can I buy with 5000 EGP?")
     st.write("- ما هو تغير سعر الذهب اليوم؟" if language == "العربية" else "- What’s the price change today?")
     st.write("- ما هي أخبار الذهب في مصر؟" if language == "العربية" else "- What’s the latest gold news in Egypt?")
+    st.write("- أريد أن أدخر 1000 جنيه شهريًا لمدة 12 شهر" if language == "العربية" else "- I want to save 1000 EGP monthly for 12 months")
     
     query = st.text_input(
         "اكتب سؤالك" if language == "العربية" else "Type your question",
@@ -322,13 +421,25 @@ with tab4:
 # Gold News Tab
 with tab5:
     st.header("أخبار الذهب" if language == "العربية" else "Gold News")
-    articles = get_news()
+    news_poller = get_news_poller()
+    news_cols = st.columns([3, 1])
+    news_query = news_cols[0].text_input("ابحث في الأخبار" if language == "العربية" else "Search news", key="news_query")
+    news_page = news_cols[1].number_input("الصفحة" if language == "العربية" else "Page", min_value=1, value=1, key="news_page")
+    if news_query:
+        articles, total = news_poller.store.search(news_query, news_page, 5)
+    else:
+        articles, total = news_poller.store.latest(news_page, 5)
     if articles:
+        st.caption(f"{total} خبر" if language == "العربية" else f"{total} articles")
         for article in articles:
             st.subheader(article['title'])
             st.write(article['description'])
             if 'url' in article:
                 st.write(f"[{'اقرأ المزيد' if language == 'العربية' else 'Read more'}]({article['url']})")
+    elif news_poller.last_error is None and news_poller.last_success is None:
+        st.write("جاري تحميل الأخبار..." if language == "العربية" else "Loading news...")
+    elif news_query or news_page > 1:
+        st.write("لا توجد نتائج" if language == "العربية" else "No results")
     else:
         st.write("تعذر جلب الأخبار" if language == "العربية" else "Failed to fetch news")
 
@@ -340,15 +451,52 @@ with tab6:
     st.write("**كيف يحمي الذهب من التضخم؟**" if language == "العربية" else "**How Does Gold Protect Against Inflation?**")
     st.write("عندما يرتفع التضخم، يتراجع قيمة العملات الورقية، لكن الذهب غالبًا ما يرتفع في القيمة، مما يحافظ على قوة شرائك." if language == "العربية" else "When inflation rises, paper currencies lose value, but gold often increases in value, preserving your purchasing power.")
 
-# Custom Alerts
+# Custom Alerts (checked in the background on every quote; notifications show on the next rerun)
 with st.expander("تنبيهات الأسعار" if language == "العربية" else "Price Alerts"):
-    alert_price = st.number_input("حدد سعر التنبيه (جنيه/جرام)" if language == "العربية" else "Set alert price (EGP/gram)", min_value=0.0, value=0.0)
-    if alert_price > 0 and st.session_state.effective_price:
-        current_price = st.session_state.effective_price
-        if current_price <= alert_price:
-            st.success(f"تنبيه: السعر الحالي {current_price:.2f} جنيه/جرام أقل من أو يساوي {alert_price:.2f}!" if language == "العربية" else f"Alert: Current price {current_price:.2f} EGP/gram is at or below {alert_price:.2f}!")
-        else:
-            st.info(f"السعر الحالي {current_price:.2f} جنيه/جرام أعلى من {alert_price:.2f}" if language == "العربية" else f"Current price {current_price:.2f} EGP/gram is above {alert_price:.2f}")
+    alert_engine = get_alert_engine()
+    alert_user = st.session_state.get("portfolio_owner", "default")
+    for notification in alert_engine.sink.drain(alert_user):
+        for alert in notification.alerts:
+            price = notification.prices[alert.karat]
+            relation = ("أقل من أو يساوي" if alert.direction == BELOW else "أعلى من أو يساوي") if language == "العربية" else ("at or below" if alert.direction == BELOW else "at or above")
+            st.success(f"تنبيه: سعر {alert.karat} {price:.2f} جنيه/جرام {relation} {alert.threshold:.2f}!" if language == "العربية" else f"Alert: {alert.karat} price {price:.2f} EGP/gram is {relation} {alert.threshold:.2f}!")
+    alert_types = {BELOW: "عندما ينخفض السعر إلى" if language == "العربية" else "When price falls to", ABOVE: "عندما يرتفع السعر إلى" if language == "العربية" else "When price rises to", "percent": "عند تغير بنسبة %" if language == "العربية" else "On a % move"}
+    alert_cols = st.columns(3)
+    alert_karat = alert_cols[0].selectbox("العيار" if language == "العربية" else "Karat", list(KARATS), index=list(KARATS).index("21K"), key="alert_karat")
+    alert_type = alert_cols[1].selectbox("النوع" if language == "العربية" else "Type", list(alert_types), format_func=alert_types.get, key="alert_type")
+    alert_value = alert_cols[2].number_input("حدد سعر التنبيه (جنيه/جرام)" if language == "العربية" else "Set alert price (EGP/gram)", value=0.0, key="alert_value")
+    current_karat_prices = {k: api_price_data["matrix"].get(k, "gram", "EGP")[0] for k in api_price_data["matrix"].karats}
+    if st.button("إضافة تنبيه" if language == "العربية" else "Add Alert") and alert_value:
+        if alert_type == "percent":
+            alert_engine.add_percent(alert_user, alert_karat, alert_value, current_karat_prices[alert_karat])
+        elif alert_value > 0:
+            alert_engine.add(alert_user, alert_karat, alert_type, alert_value)
+        # Alerts already met by the current quote fire right away (not on a fallback price)
+        if not api_price_data["fallback"]:
+            alert_engine.on_tick(current_karat_prices)
+        st.rerun()
+    for alert in alert_engine.alerts(alert_user):
+        alert_row = st.columns([4, 1])
+        current_price = current_karat_prices.get(alert.karat)
+        alert_row[0].info(f"{alert.karat}: {'أقل من أو يساوي' if alert.direction == BELOW else 'أعلى من أو يساوي'} {alert.threshold:.2f} (السعر الحالي {current_price:.2f})" if language == "العربية" else f"{alert.karat}: {'at or below' if alert.direction == BELOW else 'at or above'} {alert.threshold:.2f} (current {current_price:.2f})")
+        if alert_row[1].button("حذف" if language == "العربية" else "Remove", key=f"remove_alert_{alert.id}"):
+            alert_engine.remove(alert.id)
+            st.rerun()
 
 # Disclaimer
 st.markdown("*تنبيه: هذا النظام للمعلومات فقط ومصمم للسوق المصري باستخدام البيانات المحلية. استشر مستشارًا ماليًا.*" if language == "العربية" else "*Note: This system is for information only and designed for the Egyptian market using local data. Consult a financial advisor.*", unsafe_allow_html=True)
+
+# Timing debug panel: this rerun's spans, then every span since the process started
+metrics.observe("page.rerun", time.perf_counter() - page_started)
+metrics.stop_trace()
+if show_timings:
+    with st.sidebar.expander("التوقيت" if language == "العربية" else "Timings", expanded=True):
+        st.write("هذا التشغيل (مللي ثانية)" if language == "العربية" else "This run (ms)")
+        st.dataframe(pd.DataFrame([(name, start * 1000, seconds * 1000, failed) for name, start, seconds, failed in page_trace],
+                                  columns=["span", "start_ms", "ms", "failed"]).round(1))
+        st.write("كل التشغيلات (مللي ثانية)" if language == "العربية" else "All runs (ms)")
+        st.dataframe(pd.DataFrame.from_dict(metrics.summary(), orient="index").round(1))
+        st.write("الكاش" if language == "العربية" else "Cache")
+        st.json(market_cache.stats())
+        st.write("مزودو البيانات" if language == "العربية" else "Providers")
+        st.json(providers.status())
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import GoldCore  # noqa: E402
+from market_cache import market_cache  # noqa: E402
+from providers import providers  # noqa: E402
+
+DAYS = pd.bdate_range("2024-01-01", periods=60)
+
+
+def bars(dates, close):
+    close = np.full(len(dates), close, dtype="f8")
+    return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close},
+                        index=pd.DatetimeIndex(dates, name="Date"))
+
+
+# A core whose upstreams are local functions: 2000 USD/oz and 50 EGP/USD today,
+# GC=F history from core.gold["bars"] and EGP=X history from core.fx["bars"]
+# (none until a test sets it)
+@pytest.fixture
+def core(tmp_path):
+    gold = {"bars": bars(DAYS, 2000.0)}
+    fx = {"bars": None}
+
+    def history(symbol, start):
+        if symbol == "GC=F":
+            return gold["bars"]
+        if fx["bars"] is None:
+            raise ValueError("no FX history")
+        return fx["bars"]
+
+    core = GoldCore({}, str(tmp_path))
+    providers.register("yahoo", lambda: 2000.0, 5)
+    providers.register("alpha_vantage", lambda: 2000.0, 5)
+    providers.register("yahoo_history", history, 5)
+    providers.register("exchange_rate", lambda: {"USD": 1.0, "EGP": 50.0}, 5)
+    market_cache.clear()
+    core.gold = gold
+    core.fx = fx
+    yield core
+    market_cache.clear()
@@ -0,0 +1,29 @@
+import time
+
+from alerts import ABOVE, BELOW, AlertEngine, MemorySink
+
+
+def test_threshold_alerts_fire_once():
+    engine = AlertEngine(MemorySink(), min_interval=0)
+    engine.add("user", "21K", BELOW, 3000)
+    engine.add("user", "21K", ABOVE, 4000)
+    assert engine.on_tick({"21K": 3500}) == []
+    fired = engine.on_tick({"21K": 2900})
+    assert [alert.direction for alert in fired] == [BELOW]
+    assert engine.on_tick({"21K": 2800}) == []
+    notifications = engine.sink.drain("user")
+    assert len(notifications) == 1 and notifications[0].prices["21K"] == 2900
+
+
+def test_poller_skips_missing_quotes():
+    engine = AlertEngine(MemorySink(), min_interval=0)
+    engine.add("user", "21K", BELOW, 3000)
+    quotes = iter([None, None, {"21K": 2900}])
+    engine.start(lambda: next(quotes, None), interval=0.01)
+    deadline = time.monotonic() + 2
+    while engine.alerts("user") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    engine.stop()
+    assert engine.errors == 0
+    assert engine.alerts("user") == []
+    assert engine.sink.drain("user")[0].prices["21K"] == 2900
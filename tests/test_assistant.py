@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from assistant import LLMBatcher, ask_llm, normalize_query, response_cache, route_query
+
+
+@pytest.mark.parametrize("query, name, amount, months", [
+    ("كم سعر الذهب اليوم؟", "price", None, None),
+    ("آخر أخبار الذهب", "news", None, None),
+    ("عايز أوفر 1500 جنيه شهريا لمدة سنتين", "savings", 1500, 24),
+    ("ادخر ٢٠٠٠ جنيه لمدة 3 سنوات", "savings", 2000, 36),
+    ("وفرت 500 جنيه شهرين", "savings", 500, 2),
+    ("I want to save 1000 EGP monthly for 12 months", "savings", 1000, 12),
+    ("Save 1.5k monthly in 2025", "savings", 1500, None),
+    ("اشتري ذهب عيار 21 بـ 10,000 جنيه", "purchase", 10000, None),
+    ("How much gold can I buy with 5000 EGP?", "purchase", 5000, None),
+    ("buy 24k gold for 2000", "purchase", 2000, None),
+    # Not tool intents: these go to the language model
+    ("هل الذهب متوفر في مصر؟", None, None, None),
+    ("هل يتوفر الذهب عيار 18؟", None, None, None),
+    ("What is the best gold to buy in 2024?", None, None, None),
+    ("ما هو أفضل وقت لشراء الذهب؟", None, None, None),
+    ("How much is gold today?", None, None, None),
+    ("How much does gold cost?", "price", None, None),
+    ("how many grams in an ounce of gold", None, None, None),
+    ("Should I save in gold or dollars?", None, None, None),
+    ("عايز اوفر في الذهب", None, None, None),
+])
+def test_route_query(query, name, amount, months):
+    assert tuple(route_query(query)) == (name, amount, months)
+
+
+def test_normalize_query():
+    assert normalize_query("  أسعارُ الذهبِ اليومَ؟ ") == normalize_query("اسعار الذهب اليوم")
+
+
+class StubLLM:
+    def __init__(self):
+        self.batches = []
+
+    def batch(self, prompts, return_exceptions=True):
+        self.batches.append(list(prompts))
+        return [f"answer: {prompt}" for prompt in prompts]
+
+
+def test_batcher_groups_concurrent_prompts():
+    llm = StubLLM()
+    batcher = LLMBatcher(llm, max_batch=8, max_wait=0.2)
+    answers = {}
+    threads = [threading.Thread(target=lambda i=i: answers.update({i: batcher(f"q{i}", timeout=5)})) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert answers == {i: f"answer: q{i}" for i in range(4)}
+    assert len(llm.batches) < 4
+
+
+def test_answers_are_cached_by_normalized_question():
+    response_cache.clear()
+    llm = StubLLM()
+    batcher = LLMBatcher(llm)
+    assert ask_llm(batcher, "Is gold safe?") == "answer: Is gold safe?"
+    assert ask_llm(batcher, "is gold safe") == "answer: Is gold safe?"
+    assert len(llm.batches) == 1
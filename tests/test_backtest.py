@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from backtest import PERCENTILES, dca_backtest, goal_probability, monte_carlo, scenario_sweep
+from conversion import KARATS, TROY_OUNCE_GRAMS
+
+
+def test_dca_backtest_every_start_month():
+    # 100 a month for 3 months: from month 0 buys 10 + 5 + 6.25 grams, from month 1 5 + 6.25 + 3.125
+    result = dca_backtest([10.0, 20.0, 16.0, 32.0], 100, 3)
+    assert list(result["start"]) == [0, 1]
+    assert result["grams"] == pytest.approx([21.25, 14.375])
+    assert result["value"] == pytest.approx([21.25 * 16, 14.375 * 32])
+    assert result["return_pct"] == pytest.approx([(340 / 300 - 1) * 100, (460 / 300 - 1) * 100])
+
+
+@pytest.mark.parametrize("months, starts", [(4, 1), (5, 0), (0, 0)])
+def test_dca_backtest_short_history(months, starts):
+    result = dca_backtest([10.0, 20.0, 16.0, 32.0], 100, months)
+    assert len(result["start"]) == len(result["grams"]) == len(result["return_pct"]) == starts
+
+
+def test_monte_carlo_shapes_and_seed():
+    rng = np.random.default_rng(1)
+    prices = 1000 * np.exp(np.cumsum(rng.normal(0.005, 0.04, 60)))
+    for method in ("bootstrap", "gbm"):
+        result = monte_carlo(prices, 1000, 24, start_price=3000, n_paths=500, method=method, seed=7)
+        assert result["percentiles"] == list(PERCENTILES)
+        assert result["bands"].shape == (len(PERCENTILES), 24)
+        assert result["final_grams"].shape == (500,)
+        assert np.all(np.diff(result["bands"], axis=0) >= 0)  # p5 <= p25 <= ... <= p95
+        assert result["bands"][:, 0] == pytest.approx([1000 / 3000] * len(PERCENTILES))
+        again = monte_carlo(prices, 1000, 24, start_price=3000, n_paths=500, method=method, seed=7)
+        np.testing.assert_array_equal(again["final_grams"], result["final_grams"])
+
+
+def test_monte_carlo_flat_history_is_deterministic():
+    result = monte_carlo([50.0] * 12, 100, 6, n_paths=10, seed=0)
+    np.testing.assert_allclose(result["final_grams"], 12.0)
+    np.testing.assert_allclose(result["bands"][2], [2, 4, 6, 8, 10, 12])
+
+
+@pytest.mark.parametrize("months, n_paths", [(1, 1), (1, 100), (12, 1)])
+def test_monte_carlo_smallest_runs(months, n_paths):
+    result = monte_carlo([50.0, 55.0, 52.0], 100, months, n_paths=n_paths, seed=0)
+    assert result["bands"].shape == (len(PERCENTILES), months)
+    assert result["final_grams"].shape == (n_paths,)
+    if months == 1:
+        np.testing.assert_allclose(result["final_grams"], 100 / 52.0)  # bought at the last price
+
+
+@pytest.mark.parametrize("kwargs", [{"months": 0}, {"n_paths": 0}, {"method": "garch"}])
+def test_monte_carlo_rejects_bad_arguments(kwargs):
+    arguments = {"months": 12, "n_paths": 100, **kwargs}
+    with pytest.raises(ValueError):
+        monte_carlo([50.0, 55.0, 52.0], 100, **arguments)
+
+
+def test_goal_probability():
+    assert goal_probability([1, 2, 3, 4], 3) == 0.5
+    assert goal_probability([], 3) == 0.0
+
+
+def test_scenario_sweep_matches_the_backtest():
+    rng = np.random.default_rng(2)
+    usd_per_oz = 2000 * np.exp(np.cumsum(rng.normal(0.005, 0.03, 36)))
+    usd_egp = np.linspace(30, 50, 36)
+    sweep = scenario_sweep(usd_per_oz, usd_egp, [500, 1000], [12, 48], ["21K", "24K"], goal=5, max_workers=2)
+    # 48 months is longer than the history, so only the 12-month cells have rows
+    assert len(sweep) == 2 * 2
+    assert set(sweep["months"]) == {12}
+
+    prices = usd_per_oz * usd_egp / TROY_OUNCE_GRAMS * KARATS["21K"]
+    grams = dca_backtest(prices, 1000, 12)["grams"]
+    row = sweep[(sweep["karat"] == "21K") & (sweep["monthly_amount"] == 1000)].iloc[0]
+    assert row["starts"] == len(grams)
+    assert row["p50_grams"] == pytest.approx(np.median(grams))
+    assert row["goal_probability"] == goal_probability(grams, 5)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conversion import DEFAULT_CURRENCIES, KARATS, TROY_OUNCE_GRAMS, UNITS, karat_prices, price_matrix
+
+RATES = {"USD": 1.0, "EGP": 48.5, "EUR": 0.92, "SAR": 3.75, "AED": 3.67}
+
+
+def test_21k_gram_matches_the_original_formula():
+    usd, rate = 2350.0, 48.5
+    matrix = price_matrix(usd, RATES)
+    assert matrix.get("21K", "gram", "EGP")[0] == pytest.approx((usd * rate / 31.1035) * 0.875)
+
+
+def test_units_and_karats():
+    matrix = price_matrix(2000.0, RATES)
+    gram_24k = 2000.0 / TROY_OUNCE_GRAMS
+    assert matrix.get("24K", "ounce", "USD")[0] == pytest.approx(2000.0)
+    assert matrix.get("24K", "gram", "USD")[0] == pytest.approx(gram_24k)
+    assert matrix.get("21K", "gold_pound", "USD")[0] == pytest.approx(8 * gram_24k * 21 / 24)
+    assert matrix.get("18K", "ounce", "EGP")[0] == pytest.approx(2000.0 * 0.75 * 48.5)
+    assert matrix.values.shape == (1, len(KARATS), len(UNITS), len(DEFAULT_CURRENCIES))
+
+
+def test_series_with_per_row_fx():
+    dates = pd.bdate_range("2024-01-01", periods=3)
+    usd = pd.Series([2000.0, 2100.0, 2200.0], index=dates)
+    egp = np.array([30.0, 40.0, 50.0])
+    matrix = price_matrix(usd, {"USD": 1.0, "EGP": egp})
+    assert len(matrix) == 3
+    prices = matrix.get("21K", "gram", "EGP")
+    assert isinstance(prices, pd.Series) and prices.index.equals(dates)
+    np.testing.assert_allclose(prices, usd.to_numpy() * egp / TROY_OUNCE_GRAMS * 0.875)
+    np.testing.assert_allclose(matrix.get("24K", "ounce", "USD"), usd)
+
+
+def test_currencies_missing_from_rates():
+    matrix = price_matrix(2000.0, {"USD": 1.0, "EGP": 48.5, "JPY": 150.0})
+    assert matrix.currencies == ["EGP", "USD"]
+    with pytest.raises(ValueError):
+        matrix.get("21K", "gram", "EUR")
+    with pytest.raises(KeyError):
+        price_matrix(2000.0, {"USD": 1.0}, currencies=["EGP"])
+
+
+def test_karat_prices_from_a_21k_price():
+    prices = karat_prices(3500.0)
+    assert prices["21K"] == 3500.0
+    assert prices["24K"] == pytest.approx(4000.0)
+    assert prices["18K"] == pytest.approx(3000.0)
+    assert karat_prices(4000.0, "24K") == pytest.approx(prices)
+
+
+def test_table_is_karats_by_units():
+    matrix = price_matrix(pd.Series([2000.0, 2400.0]), RATES)
+    table = matrix.table("USD")
+    assert list(table.index) == list(KARATS) and list(table.columns) == list(UNITS)
+    assert table.loc["24K", "ounce"] == pytest.approx(2400.0)
+    assert matrix.table("USD", row=0).loc["24K", "ounce"] == pytest.approx(2000.0)
+    assert matrix.table("EGP").loc["21K", "gram"] == pytest.approx(matrix.get("21K", "gram", "EGP").iloc[-1])
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from conftest import DAYS, bars
+from conversion import KARATS, TROY_OUNCE_GRAMS
+from market_cache import market_cache
+
+
+def test_current_price(core):
+    price = core.current_price()
+    assert price["usd_per_oz"] == 2000.0
+    assert not price["fallback"]
+    assert price["egp_per_gram_21k"] == pytest.approx(2000 / TROY_OUNCE_GRAMS * 50 * KARATS["21K"])
+
+
+def test_convert_uses_the_given_prices(core):
+    matrix = core.current_price()["matrix"]
+    result = core.convert(2, "24K", "gram", "EGP", matrix)
+    assert result["value"] == pytest.approx(2 * 2000 / TROY_OUNCE_GRAMS * 50 * KARATS["24K"])
+    with pytest.raises(ValueError):
+        core.convert(1, "9K", "gram", "EGP", matrix)
+
+
+def test_indicators_start_over_when_fx_history_arrives(core):
+    first = core.indicators().frame()["close"]
+    assert first.iloc[0] == pytest.approx(first.iloc[-1])
+
+    core.fx["bars"] = bars(DAYS, 30.0)
+    market_cache.invalidate("history", "EGP=X")
+    closes = core.indicators().frame()["close"]
+    assert len(closes) == len(first)
+    # Every bar, not only the new ones, now uses the day's FX rate
+    assert closes.iloc[0] == pytest.approx(first.iloc[0] * 30 / 50)
+    assert closes.iloc[-1] == pytest.approx(first.iloc[-1] * 30 / 50)
+
+
+def test_indicators_stay_incremental_when_a_day_is_appended(core, monkeypatch):
+    core.fx["bars"] = bars(DAYS, 30.0)
+    full = len(core.indicators().frame())
+
+    days = DAYS.append(pd.DatetimeIndex([DAYS[-1] + pd.offsets.BDay()]))
+    core.gold["bars"] = bars(days, 2010.0)
+    core.fx["bars"] = bars(days, 30.0)
+    market_cache.invalidate("history")
+    engine = core.indicator_engine
+    updates = []
+    monkeypatch.setattr(engine, "update", lambda *args: updates.append(args) or type(engine).update(engine, *args))
+    assert len(core.indicators().frame()) == full + 1
+    # The last known day is refed (its bar may have moved) and the new day added
+    assert len(updates) == 2
+
+
+def test_indicators_start_over_when_past_fx_changes(core):
+    core.fx["bars"] = bars(DAYS, 30.0)
+    first = core.indicators().frame()["close"]
+    core.fx["bars"] = bars(DAYS, 40.0)
+    market_cache.invalidate("history", "EGP=X")
+    closes = core.indicators().frame()["close"]
+    assert closes.iloc[0] == pytest.approx(first.iloc[0] * 40 / 30)
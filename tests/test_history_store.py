@@ -0,0 +1,62 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from history_store import HistoryStore
+
+SEED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "GC=F_seed.csv")
+
+
+def bars(dates, close):
+    return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close},
+                        index=pd.DatetimeIndex(pd.to_datetime(dates), name="Date"))
+
+
+class FakeYahoo:
+    def __init__(self, result):
+        self.result = result
+        self.starts = []
+
+    def __call__(self, start):
+        self.starts.append(start)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.fixture
+def seed(tmp_path):
+    path = tmp_path / "GC=F_seed.csv"
+    shutil.copy(SEED, path)
+    return str(path)
+
+
+def test_empty_store_is_seeded_and_synced_from_the_last_seed_day(tmp_path, seed):
+    seed_rows = pd.read_csv(seed)
+    last_day = seed_rows["Date"].iloc[-1]
+    fetch = FakeYahoo(bars([last_day, "2024-02-01"], np.array([2100.0, 2110.0])))
+    store = HistoryStore(str(tmp_path / "GC=F.npy"), fetch, seed_path=seed)
+    assert store.sync() == 1
+    assert fetch.starts == [last_day]
+    frame = store.frame()
+    assert len(frame) == len(seed_rows) + 1
+    # The last seeded day is replaced by the fetched bar
+    assert frame.loc[last_day, "Close"] == 2100.0
+    assert frame["Close"].iloc[0] == seed_rows["Close"].iloc[0]
+
+
+def test_seeded_store_works_offline(tmp_path, seed):
+    store = HistoryStore(str(tmp_path / "GC=F.npy"), FakeYahoo(ConnectionError("offline")), seed_path=seed)
+    assert store.sync() == 0
+    assert isinstance(store.last_error, ConnectionError)
+    assert len(store.frame("1mo")) > 0
+    assert store.tail(1)["close"][0] == pd.read_csv(seed)["Close"].iloc[-1]
+
+
+def test_empty_store_without_seed_raises_offline(tmp_path):
+    store = HistoryStore(str(tmp_path / "GC=F.npy"), FakeYahoo(ConnectionError("offline")))
+    with pytest.raises(ConnectionError):
+        store.sync()
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from ledger import BUY, SELL, Ledger, revalue_lots
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = Ledger(str(tmp_path / "portfolio.db"))
+    yield ledger
+    ledger.close()
+
+
+def test_fifo_cost_of_sales(ledger):
+    a = ledger.create_portfolio("user", "A")
+    ledger.add_lot(a, BUY, 10, 100, ts=datetime(2024, 1, 1))
+    ledger.add_lot(a, BUY, 10, 200, ts=datetime(2024, 2, 1))
+    ledger.add_lot(a, SELL, 15, 300, ts=datetime(2024, 3, 1))
+    row = ledger.revalue({"21K": 250}).loc[a]
+    assert row["grams"] == pytest.approx(5)
+    assert row["cost_basis"] == pytest.approx(1000)
+    assert row["realized_pl"] == pytest.approx(15 * 300 - (1000 + 1000))
+    assert row["unrealized_pl"] == pytest.approx(5 * 250 - 1000)
+
+
+def test_average_cost_of_sales(ledger):
+    a = ledger.create_portfolio("user", "A")
+    ledger.add_lot(a, BUY, 10, 100, ts=datetime(2024, 1, 1))
+    ledger.add_lot(a, BUY, 10, 200, ts=datetime(2024, 2, 1))
+    ledger.add_lot(a, SELL, 10, 300, ts=datetime(2024, 3, 1))
+    row = ledger.revalue({"21K": 250}, "average").loc[a]
+    assert row["cost_basis"] == pytest.approx(1500)
+    assert row["realized_pl"] == pytest.approx(1500)
+
+
+def test_groups_are_costed_separately(ledger):
+    a = ledger.create_portfolio("user", "A")
+    b = ledger.create_portfolio("user", "B")
+    ledger.add_lot(a, BUY, 10, 100, "18K", ts=datetime(2024, 1, 1))
+    ledger.add_lot(a, BUY, 10, 500, "21K", ts=datetime(2024, 1, 1))
+    ledger.add_lot(a, SELL, 5, 150, "18K", ts=datetime(2024, 2, 1))
+    ledger.add_lot(b, BUY, 5, 1000, ts=datetime(2024, 1, 1))
+    values = ledger.revalue({"18K": 150, "21K": 1000})
+    assert values.loc[a, "cost_basis"] == pytest.approx(500 + 5000)
+    assert values.loc[a, "realized_pl"] == pytest.approx(5 * 50)
+    assert values.loc[b, "cost_basis"] == pytest.approx(5000)
+
+
+def test_oversold_group_does_not_read_other_groups(ledger):
+    a = ledger.create_portfolio("user", "A")
+    b = ledger.create_portfolio("user", "B")
+    first = ledger.add_lot(a, BUY, 10, 100, ts=datetime(2024, 1, 1))
+    ledger.add_lot(a, SELL, 8, 110, ts=datetime(2024, 2, 1))
+    ledger.add_lot(a, BUY, 5, 120, ts=datetime(2024, 3, 1))
+    ledger.add_lot(b, BUY, 5, 1000, ts=datetime(2024, 1, 1))
+    lots = ledger.lots()
+    row = revalue_lots(lots[lots["id"] != first], {"21K": 130}).loc[a]
+    assert row["grams"] >= 0
+    assert row["cost_basis"] == pytest.approx(0)
+    assert row["realized_pl"] == pytest.approx(8 * 110 - 5 * 120)
+
+
+def test_sell_more_than_held_is_rejected(ledger):
+    a = ledger.create_portfolio("user", "A")
+    ledger.add_lot(a, BUY, 10, 100, ts=datetime(2024, 1, 1))
+    with pytest.raises(ValueError):
+        ledger.add_lot(a, SELL, 11, 100, ts=datetime(2024, 2, 1))
+    assert len(ledger.lots()) == 1
+
+
+def test_back_dated_sell_cannot_oversell_later_sells(ledger):
+    a = ledger.create_portfolio("user", "A")
+    ledger.add_lot(a, BUY, 10, 100, ts=datetime(2024, 1, 1))
+    ledger.add_lot(a, SELL, 8, 110, ts=datetime(2024, 3, 1))
+    with pytest.raises(ValueError):
+        ledger.add_lot(a, SELL, 3, 110, ts=datetime(2024, 2, 1))
+    assert len(ledger.lots()) == 2
+
+
+def test_deleting_a_buy_that_sells_depend_on_is_rejected(ledger):
+    a = ledger.create_portfolio("user", "A")
+    first = ledger.add_lot(a, BUY, 10, 100, ts=datetime(2024, 1, 1))
+    ledger.add_lot(a, SELL, 8, 110, ts=datetime(2024, 2, 1))
+    ledger.add_lot(a, BUY, 5, 120, ts=datetime(2024, 3, 1))
+    with pytest.raises(ValueError):
+        ledger.delete_lot(first)
+    assert first in set(ledger.lots()["id"])
+
+
+def test_import_rejects_oversold_portfolios(ledger):
+    a = ledger.create_portfolio("user", "A")
+    lots = pd.DataFrame({"portfolio_id": [a, a], "ts": ["2024-01-01", "2024-02-01"], "side": [SELL, BUY],
+                         "karat": ["21K", "21K"], "grams": [5.0, 5.0], "price": [100.0, 100.0]})
+    with pytest.raises(ValueError):
+        ledger.import_lots(lots)
+    assert ledger.lots().empty
+
+
+def test_average_cost_of_a_closed_sale_ignores_later_buys(ledger):
+    a = ledger.create_portfolio("user", "A")
+    ledger.add_lot(a, BUY, 10, 100, ts=datetime(2024, 1, 1))
+    ledger.add_lot(a, SELL, 10, 300, ts=datetime(2024, 2, 1))
+    before = ledger.revalue({"21K": 200}, "average").loc[a]
+    ledger.add_lot(a, BUY, 10, 200, ts=datetime(2024, 3, 1))
+    row = ledger.revalue({"21K": 200}, "average").loc[a]
+    assert before["realized_pl"] == pytest.approx(2000)
+    assert row["realized_pl"] == pytest.approx(2000)
+    assert row["cost_basis"] == pytest.approx(2000)
+    assert row["unrealized_pl"] == pytest.approx(0)
+
+
+def test_average_cost_is_the_running_average(ledger):
+    a = ledger.create_portfolio("user", "A")
+    b = ledger.create_portfolio("user", "B")
+    ledger.add_lot(a, BUY, 10, 100, ts=datetime(2024, 1, 1))
+    ledger.add_lot(a, SELL, 5, 150, ts=datetime(2024, 2, 1))
+    ledger.add_lot(a, BUY, 10, 200, ts=datetime(2024, 3, 1))
+    ledger.add_lot(a, SELL, 5, 250, ts=datetime(2024, 4, 1))
+    ledger.add_lot(b, BUY, 4, 1000, ts=datetime(2024, 1, 1))
+    values = ledger.revalue({"21K": 200}, "average")
+    # Average after the second buy: (5 * 100 + 10 * 200) / 15
+    average = 2500 / 15
+    assert values.loc[a, "cost_basis"] == pytest.approx(10 * average)
+    assert values.loc[a, "realized_pl"] == pytest.approx(5 * 50 + 5 * (250 - average))
+    assert values.loc[b, "cost_basis"] == pytest.approx(4000)
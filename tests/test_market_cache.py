@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from market_cache import MarketCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Loader that counts its calls and, once blocked, waits for `release`
+class Loader:
+    def __init__(self, value, blocked=False):
+        self.value = value
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not blocked:
+            self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        return self.value
+
+
+def wait_until(condition, timeout=5):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return MarketCache(ttls={"quote": 10}, stale_for={"quote": 100}, max_entries=2, clock=clock)
+
+
+def test_concurrent_misses_share_one_load(cache):
+    loader = Loader(2350.0, blocked=True)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("quote", "XAU", loader))) for _ in range(8)]
+    threads[0].start()
+    assert loader.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    wait_until(lambda: cache.stats()["quote"]["misses"] == 8)
+    loader.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert loader.calls == 1
+    assert results == [2350.0] * 8
+    assert cache.stats()["quote"] == {"misses": 8, "loads": 1}
+
+
+def test_stale_value_is_served_while_one_refresh_runs(cache, clock):
+    assert cache.get("quote", "XAU", Loader(1.0)) == 1.0
+    clock.now = 5
+    assert cache.get("quote", "XAU", Loader(-1.0)) == 1.0
+
+    clock.now = 15
+    refresh = Loader(2.0, blocked=True)
+    assert cache.get("quote", "XAU", refresh) == 1.0
+    assert refresh.started.wait(5)
+    assert cache.get("quote", "XAU", refresh) == 1.0
+    refresh.release.set()
+    wait_until(lambda: cache.peek("quote", "XAU") == 2.0)
+    assert refresh.calls == 1
+    assert cache.get("quote", "XAU", Loader(-1.0)) == 2.0
+    assert cache.stats()["quote"] == {"misses": 1, "loads": 2, "hits": 2, "stale_hits": 2}
+
+
+def test_entries_past_the_stale_window_are_loaded_again(cache, clock):
+    cache.get("quote", "XAU", Loader(1.0))
+    clock.now = 110
+    assert cache.peek("quote", "XAU") is None
+    assert cache.get("quote", "XAU", Loader(2.0)) == 2.0
+    assert cache.stats()["quote"] == {"misses": 2, "loads": 2}
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.set("quote", "a", 1)
+    cache.set("quote", "b", 2)
+    assert cache.get("quote", "a", Loader(-1)) == 1
+    cache.set("quote", "c", 3)
+    assert cache.peek("quote", "b") is None
+    assert cache.peek("quote", "a") == 1 and cache.peek("quote", "c") == 3
+    stats = cache.stats()
+    assert stats["_size"] == 2
+    assert stats["quote"]["evictions"] == 1
+
+
+def test_failed_load_is_raised_and_not_cached(cache):
+    def fail():
+        raise ValueError("upstream down")
+
+    with pytest.raises(ValueError, match="upstream down"):
+        cache.get("quote", "XAU", fail)
+    assert cache.get("quote", "XAU", Loader(1.0)) == 1.0
+    assert cache.stats()["quote"] == {"misses": 2, "errors": 1, "loads": 1}
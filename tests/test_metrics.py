@@ -0,0 +1,37 @@
+import pytest
+
+from metrics import Metrics, metrics
+from providers import CircuitOpenError, ProviderPool
+
+
+def test_summary_counts_spans_and_errors():
+    m = Metrics()
+    with m.span("a"):
+        pass
+    with pytest.raises(ValueError):
+        with m.span("a"):
+            raise ValueError
+    summary = m.summary()["a"]
+    assert summary["count"] == 2 and summary["errors"] == 1
+
+
+def test_trace_includes_calls_on_pool_threads():
+    pool = ProviderPool(max_workers=2)
+    pool.register("quote", lambda: 1.0, 5)
+    pool.register("fx", lambda: 2.0, 5)
+    with metrics.trace() as trace:
+        with metrics.span("page"):
+            results = pool.gather({"quote": lambda: pool.call("quote"), "fx": lambda: pool.call("fx")}, timeout=5)
+    assert results == {"quote": 1.0, "fx": 2.0}
+    assert {name for name, _, _, _ in trace} == {"page", "upstream.quote", "upstream.fx"}
+    assert metrics.current_trace() is None
+
+
+def test_breaker_opens_after_repeated_failures():
+    pool = ProviderPool(max_workers=1)
+    pool.register("flaky", lambda: 1 / 0, 5, failure_threshold=2)
+    for _ in range(2):
+        with pytest.raises(ZeroDivisionError):
+            pool.call("flaky")
+    with pytest.raises(CircuitOpenError):
+        pool.call("flaky")
@@ -0,0 +1,76 @@
+import sqlite3
+import time
+
+import pytest
+
+from news import NewsPoller, NewsStore
+
+
+def article(i, title=None):
+    return {"title": title or f"Gold price update {i}", "description": "Gold in Egypt",
+            "url": f"https://example.com/{i}", "publishedAt": f"2024-01-{i:02d}T00:00:00Z"}
+
+
+class FakeResponse:
+    def __init__(self, articles, status_code=200):
+        self.status_code = status_code
+        self.headers = {"ETag": "v1"}
+        self._articles = articles
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"status": "ok", "articles": self._articles}
+
+
+# NewsAPI stand-in: each get() returns (or raises) the next item of `replies`
+class FakeSession:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append((params, headers))
+        reply = self.replies.pop(0) if self.replies else FakeResponse([], 304)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NewsStore(str(tmp_path / "news.db"))
+
+
+def test_store_deduplicates_and_searches(store, tmp_path):
+    assert store.add([article(1), article(2), article(1)]) == 2
+    assert store.add([article(2)]) == 0
+    articles, total = store.latest(1, 10)
+    assert total == 2 and articles[0]["url"].endswith("/2")
+    matches, _ = store.search("price update", 1, 10)
+    assert len(matches) == 2
+    assert len(NewsStore(str(tmp_path / "news.db"))) == 2
+
+
+def test_conditional_fetch(store):
+    session = FakeSession([FakeResponse([article(1), article(2)])])
+    poller = NewsPoller(store, "key", session=session)
+    assert poller.fetch_once() == 2
+    assert poller.fetch_once() == 0
+    params, headers = session.calls[1]
+    assert params["from"] == "2024-01-02T00:00:00Z"
+    assert headers["If-None-Match"] == "v1"
+
+
+def test_poller_survives_unexpected_errors(store):
+    session = FakeSession([sqlite3.OperationalError("database is locked"), FakeResponse([article(1)])])
+    poller = NewsPoller(store, "key", interval=60, retry_delay=0.01, session=session)
+    poller.start()
+    deadline = time.monotonic() + 2
+    while poller.last_success is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    poller.stop()
+    assert poller.last_success is not None
+    assert poller.failures == 0
+    assert len(store) == 1
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from providers import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ProviderPool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# A pool with a "slow" provider that answers once `release` is set
+@pytest.fixture
+def pool():
+    release = threading.Event()
+    pool = ProviderPool(max_workers=2)
+    pool.register("slow", lambda: release.wait(5) and "slow", 5)
+    pool.register("fast", lambda: "fast", 5)
+    pool.register("broken", lambda: 1 / 0, 5)
+    pool.release = release
+    yield pool
+    release.set()
+
+
+def test_missed_deadline_is_a_timeout_error(pool):
+    pool.register("hasty", lambda: pool.release.wait(5), 0.05)
+    with pytest.raises(TimeoutError, match="hasty did not answer"):
+        pool.call("hasty")
+
+
+def test_hedge_asks_the_secondary_when_the_primary_is_slow(pool):
+    assert pool.hedged("slow", "fast", hedge_after=0.05) == ("fast", "fast")
+
+
+def test_hedge_keeps_a_primary_that_answers_in_time(pool):
+    pool.release.set()
+    assert pool.hedged("slow", "fast", hedge_after=5) == ("slow", "slow")
+
+
+def test_hedge_starts_at_once_when_the_primary_fails(pool):
+    start = time.monotonic()
+    assert pool.hedged("broken", "fast", hedge_after=30) == ("fast", "fast")
+    assert time.monotonic() - start < 5
+
+
+def test_hedge_raises_when_both_fail(pool):
+    pool.register("also_broken", lambda: {}["missing"], 5)
+    with pytest.raises(KeyError):
+        pool.hedged("broken", "also_broken", hedge_after=0.05)
+
+
+@pytest.mark.parametrize("probe_succeeds, state", [(True, CLOSED), (False, OPEN)])
+def test_half_open_probe_closes_or_reopens_the_breaker(probe_succeeds, state):
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock.now = 59.9
+    assert breaker.state == OPEN and not breaker.allow()
+    clock.now = 60.0
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+
+    if probe_succeeds:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+    assert breaker.state == state
+    assert breaker.allow() == probe_succeeds
+    if not probe_succeeds:
+        clock.now = 120.0
+        assert breaker.state == HALF_OPEN
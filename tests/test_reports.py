@@ -0,0 +1,65 @@
+import io
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conversion import KARATS
+from ledger import BUY, SELL, Ledger
+from reports import REPORT_MAX_AGE, ReportRenderer, build_statements, render_statement
+
+
+@pytest.fixture
+def statements(tmp_path):
+    ledger = Ledger(str(tmp_path / "portfolio.db"))
+    for name in ("A", "B"):
+        portfolio_id = ledger.create_portfolio("user", name)
+        ledger.add_lot(portfolio_id, BUY, 10, 3000, ts=datetime(2024, 1, 2))
+        ledger.add_lot(portfolio_id, SELL, 4, 3500, ts=datetime(2024, 3, 1))
+    dates = pd.bdate_range("2024-01-01", periods=120)
+    history = pd.DataFrame({k: np.linspace(3000, 3600, len(dates)) * purity / KARATS["21K"]
+                            for k, purity in KARATS.items()}, index=dates)
+    prices = {k: float(history[k].iloc[-1]) for k in history.columns}
+    statements = build_statements(ledger, ledger.portfolios("user"), prices, history)
+    ledger.close()
+    return statements
+
+
+def test_render_statement(statements):
+    out = io.BytesIO()
+    render_statement(statements[0], out)
+    assert out.getvalue().startswith(b"%PDF")
+
+
+def test_renderer_returns_one_report_per_statement(statements):
+    renderer = ReportRenderer(max_workers=1)
+    try:
+        reports = renderer.submit(statements).results(timeout=60)
+    finally:
+        renderer.shutdown()
+    assert len(reports) == len(statements)
+    assert all(report.startswith(b"%PDF") for report in reports)
+
+
+def test_exports_get_their_own_directories(statements, tmp_path):
+    out_dir = tmp_path / "reports"
+    old = out_dir / "job-20240101-000000-old"
+    old.mkdir(parents=True)
+    (old / "statement_1_2024-01-01.pdf").write_bytes(b"%PDF")
+    os.utime(old, (time.time() - 2 * REPORT_MAX_AGE,) * 2)
+    renderer = ReportRenderer(max_workers=1)
+    try:
+        first = renderer.submit(statements, str(out_dir))
+        second = renderer.submit(statements, str(out_dir))
+        paths = first.results(timeout=60) + second.results(timeout=60)
+    finally:
+        renderer.shutdown()
+    assert first.directory != second.directory
+    assert len(set(paths)) == 2 * len(statements)
+    assert {os.path.dirname(path) for path in paths} == {first.directory, second.directory}
+    assert all(os.path.getsize(path) > 0 for path in paths)
+    assert not old.exists()
+    assert sorted(os.listdir(out_dir)) == sorted(os.path.basename(job.directory) for job in (first, second))
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import service
+
+
+# GET each path against an app over the offline core, once the quote is loaded
+def get(core, *paths):
+    async def run():
+        app = service.create_app(core)
+        async with TestClient(TestServer(app)) as client:
+            while app[service.STATE].quote is None:
+                await asyncio.sleep(0.01)
+            responses = []
+            for path in paths:
+                response = await client.get(path)
+                responses.append((response.status, await response.json()))
+            return responses
+    return asyncio.run(run())
+
+
+def test_convert(core):
+    [(status, body)] = get(core, "/convert?quantity=2&karat=24K&unit=gram&currency=EGP")
+    assert status == 200
+    assert body["value"] == pytest.approx(2 * core.convert(1, "24K")["price"])
+
+
+@pytest.mark.parametrize("path", [
+    "/convert?karat=9K",
+    "/convert?quantity=nan",
+    "/plan?monthly_amount=nan",
+    "/plan?monthly_amount=1000&months=1000000&projection=1",
+    "/plan?monthly_amount=inf",
+    "/plan?monthly_amount=1000&projection=1&paths=0",
+    "/plan?monthly_amount=1000&projection=1&paths=-5",
+    "/plan",
+])
+def test_bad_requests(core, path):
+    [(status, body)] = get(core, path)
+    assert status == 400
+    assert "error" in body
+
+
+def test_plan(core):
+    [(status, body)] = get(core, "/plan?monthly_amount=1000&months=12")
+    assert status == 200
+    assert body["total_amount"] == 12000